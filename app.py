@@ -1,285 +1,314 @@
-from flask import Flask, jsonify, abort, request
+import os
+
+from flask import Flask, Response, jsonify, abort, request, url_for
 from sqlalchemy import exc
 from models import setup_db, Owner, Pet, Appointment
 from flask_migrate import Migrate
 from flask_cors import CORS
-from auth import requires_auth
+from auth import AuthError, requires_auth
+from queries import date_range, embed_query, export_response, list_page, parse_embed
+from bulk import bulk_create
+from checkins import create_checkin
+from updates import bulk_update, update_one
+from serializers import json_response
+from etags import collection_etag, etag_matches, not_modified, row_etag, stored_row_etag, with_etag
+from cache import ResponseCache
+from database import pool_collector
+from instrumentation import record_request, start_request
+from metrics import REGISTRY, Registry
+from validators import validate_owner, validate_pet, validate_appointment, validate_owner_update, \
+    validate_pet_update, validate_appointment_update, owner_values, pet_values, appointment_values, \
+    owner_update_values, pet_update_values, appointment_update_values
 
 
 def create_app(test_config=None):
     app = Flask(__name__)
+    app.config.from_mapping(
+        # memory, redis or none, the memory cache is per worker so keep the ttl short
+        RESPONSE_CACHE=os.environ.get('RESPONSE_CACHE', 'memory'),
+        RESPONSE_CACHE_URL=os.environ.get('RESPONSE_CACHE_URL', 'redis://localhost:6379/0'),
+        RESPONSE_CACHE_SIZE=int(os.environ.get('RESPONSE_CACHE_SIZE', 1024)),
+        RESPONSE_CACHE_MAX_BYTES=int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        RESPONSE_CACHE_TTL=int(os.environ.get('RESPONSE_CACHE_TTL', 30)),
+        # seconds after a write that responses read from a replica aren't stored, it may not have the write yet
+        RESPONSE_CACHE_REPLICA_LAG=float(os.environ.get('RESPONSE_CACHE_REPLICA_LAG', 5)))
+    if test_config is not None:
+        app.config.update(test_config)
     db = setup_db(app)
 
+    metrics = app.extensions['metrics'] = Registry()
+    metrics.add_collector(pool_collector(db, app))
+    if app.extensions['replicas'] is not None:
+        metrics.add_collector(app.extensions['replicas'].collect)
+    response_cache = app.extensions['response_cache'] = ResponseCache.from_config(app.config)
+    if response_cache is not None:
+        metrics.add_collector(response_cache.collect)
+        cached = response_cache.cached
+    else:
+        def cached(model):
+            return lambda f: f
+
     CORS(app, resources={r"*": {"origins": "*"}})
     migrate = Migrate(app, db)
 
+    @app.before_request
+    def before_request():
+        start_request()
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,true')
         response.headers.add('Access-Control-Allow-Methods', 'GET,PATCH,POST,DELETE')
-        return response
+        return record_request(response)
+
+    @app.route('/metrics', methods=['GET'])
+    @requires_auth(['get-metrics'])
+    def get_metrics(auth_token):
+        # every gunicorn worker keeps its own numbers, the label keeps their series apart
+        return Response(REGISTRY.render(metrics, labels={'worker': os.getpid()}), mimetype='text/plain; version=0.0.4')
 
     @app.route('/owners', methods=['GET', 'POST'])
     @requires_auth(['get-owners', 'post-owners'])
+    @cached(Owner)
     def get_owners(auth_token):
 
-        if request.method == 'GET':
-            owners = Owner.query.all()
+        if request.method in ('GET', 'HEAD'):
+            etag = collection_etag(Owner)
+            if etag_matches(etag):
+                return not_modified(etag)
+
+            owners, next_cursor = list_page(Owner)
 
             if len(owners) == 0:
                 abort(404, {'message': 'No owners found'})
-            formatted_owners = [owner.format() for owner in owners]
-            return jsonify({
+            return with_etag(json_response({
                 'success': True,
-                'owners': formatted_owners
-            }), 200
+                'owners': owners,
+                'next_cursor': next_cursor
+            }), etag)
 
         if request.method == 'POST':
             owner_data = request.json
 
-            if 'name' not in owner_data:
-                abort(422, {'message': 'Owner must have a name'})
-            if 'phone' not in owner_data:
-                abort(422, {'message': 'Owner must have a phone number'})
-            new_owner = Owner(owner_data['name'], owner_data['phone'])
-            new_owner.insert()
-            return jsonify({
-                'success': True
-            }), 204
-
-    @app.route('/owners/<owner_id>', methods=['GET', 'PUT', 'DELETE'])
-    @requires_auth(['get-owners', 'put-owners', 'delete-owners'])
-    def handle_owner(auth_token, owner_id):
-        if request.method == 'GET':
-            owner = Owner.query.filter_by(id=owner_id).first()
-            if owner is None:
-                abort(404, {'message': 'Owner not found'})
+            message = validate_owner(owner_data)
+            if message is not None:
+                abort(422, {'message': message})
+            new_owner = Owner(**owner_values(owner_data))
+            created = new_owner.insert()
             return jsonify({
                 'success': True,
-                'owner': owner.format()
-            }), 200
-        if request.method == 'PUT':
-            update_data = request.json
+                'owner': created
+            }), 201, {'Location': url_for('handle_owner', owner_id=created['id'])}
 
-            if update_data is None:
-                abort(422, {'message': 'Request missing body'})
-            if 'name' not in update_data and 'phone' not in update_data:
-                abort(422, {'message': 'Must include a value to update'})
+    @app.route('/owners/bulk', methods=['POST'])
+    @requires_auth(['post-owners'])
+    def bulk_create_owners(auth_token):
+        return bulk_create(Owner, validate_owner, owner_values)
 
-            owner = Owner.query.filter_by(id=owner_id).first()
+    @app.route('/owners', methods=['PATCH'])
+    @requires_auth(['put-owners'])
+    def bulk_update_owners(auth_token):
+        return bulk_update(Owner, validate_owner_update, owner_update_values, 'owners')
 
-            if owner is None:
-                abort(404, {'message': 'Can not update, owner does not exist'})
-            if 'name' in update_data:
-                owner.name = update_data['name']
-            if 'phone' in update_data:
-                owner.phone = update_data['phone']
+    @app.route('/owners/export', methods=['GET'])
+    @requires_auth(['get-owners'])
+    def export_owners(auth_token):
+        return export_response(Owner, 'owners')
 
-            owner.update()
+    @app.route('/owners/<owner_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
+    @requires_auth(['get-owners', 'put-owners', 'delete-owners'])
+    def handle_owner(auth_token, owner_id):
+        if request.method in ('GET', 'HEAD'):
+            embed = parse_embed(Owner)
+            etag = stored_row_etag(Owner, owner_id, embed)
+            if etag_matches(etag):
+                return not_modified(etag)
 
-            return jsonify({
+            owner = embed_query(Owner, embed).filter_by(id=owner_id).first()
+            if owner is None:
+                abort(404, {'message': 'Owner not found'})
+            return with_etag(json_response({
                 'success': True,
-            }), 200
+                'owner': owner.format(embed)
+            }), None if embed else row_etag(owner))
+        if request.method in ('PUT', 'PATCH'):
+            return update_one(Owner, owner_id, validate_owner_update, owner_update_values, 'owner')
 
         if request.method == 'DELETE':
-            '''
-            adding this to handle one edge case
-            '''
-            if 'delete-owners' not in auth_token['permissions']:
-                abort(403, {'message': "Missing delete permission"})
-
             owner = Owner.query.filter_by(id=owner_id).first()
 
             if owner is None:
                 abort(404, {'message': 'Can not delete, owner does not exist'})
 
-            # delete any appointments first
-            appointments = Appointment.query.filter_by(owner_id=owner.id)
-            if appointments is not None:
-                for appointment in appointments:
-                    appointment.delete()
-
-            owner.delete()
+            deleted_appointments = owner.delete()
 
             return jsonify({
                 'success': True,
+                'deleted': {
+                    'owners': 1,
+                    'appointments': deleted_appointments
+                }
             }), 200
 
     @app.route('/pets', methods=['GET', 'POST'])
     @requires_auth(['get-pets', 'post-pets'])
+    @cached(Pet)
     def get_pets(auth_token):
 
-        if request.method == 'GET':
-            pets = Pet.query.all()
+        if request.method in ('GET', 'HEAD'):
+            etag = collection_etag(Pet)
+            if etag_matches(etag):
+                return not_modified(etag)
+
+            pets, next_cursor = list_page(Pet)
 
             if len(pets) == 0:
                 abort(404, {'message': 'No pets found'})
-            formatted_pets = [pet.format() for pet in pets]
-            return jsonify({
+            return with_etag(json_response({
                 'success': True,
-                'pets': formatted_pets
-            }), 200
+                'pets': pets,
+                'next_cursor': next_cursor
+            }), etag)
 
         if request.method == 'POST':
             pet_data = request.json
 
-            # adding this since breed is optional
-            breed = ''
-
-            if 'name' not in pet_data:
-                abort(422, {'message': 'Pet must have a name'})
-            if 'species' not in pet_data:
-                abort(422, {'message': 'Pet must have a species'})
-            if 'breed' in pet_data:
-                breed = pet_data['breed']
-            new_pet = Pet(pet_data['name'], pet_data['species'], breed)
-            new_pet.insert()
-            return jsonify({
-                'success': True
-            }), 204
-
-    @app.route('/pets/<pet_id>', methods=['GET', 'PUT', 'DELETE'])
-    @requires_auth(['get-pets', 'put-pets', 'delete-pets'])
-    def handle_pet(auth_token, pet_id):
-        if request.method == 'GET':
-            pet = Pet.query.filter_by(id=pet_id).first()
-            if pet is None:
-                abort(404, {'message': 'Pet not found'})
+            message = validate_pet(pet_data)
+            if message is not None:
+                abort(422, {'message': message})
+            new_pet = Pet(**pet_values(pet_data))
+            created = new_pet.insert()
             return jsonify({
                 'success': True,
-                'pet': pet.format()
-            }), 200
-        if request.method == 'PUT':
-            update_data = request.json
+                'pet': created
+            }), 201, {'Location': url_for('handle_pet', pet_id=created['id'])}
 
-            if update_data is None:
-                abort(422, {'message': 'Request missing body'})
-            if 'name' not in update_data and 'species' not in update_data and 'breed' not in update_data:
-                abort(422, {'message': 'Must include a value to update'})
+    @app.route('/pets/bulk', methods=['POST'])
+    @requires_auth(['post-pets'])
+    def bulk_create_pets(auth_token):
+        return bulk_create(Pet, validate_pet, pet_values)
 
-            pet = Pet.query.filter_by(id=pet_id).first()
+    @app.route('/pets', methods=['PATCH'])
+    @requires_auth(['put-pets'])
+    def bulk_update_pets(auth_token):
+        return bulk_update(Pet, validate_pet_update, pet_update_values, 'pets')
 
-            if pet is None:
-                abort(404, {'message': 'Can not update, pet does not exist'})
-            if 'name' in update_data:
-                pet.name = update_data['name']
-            if 'species' in update_data:
-                pet.species = update_data['species']
-            if 'breed' in update_data:
-                pet.breed = update_data['breed']
+    @app.route('/pets/export', methods=['GET'])
+    @requires_auth(['get-pets'])
+    def export_pets(auth_token):
+        return export_response(Pet, 'pets')
 
-            pet.update()
+    @app.route('/pets/<pet_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
+    @requires_auth(['get-pets', 'put-pets', 'delete-pets'])
+    def handle_pet(auth_token, pet_id):
+        if request.method in ('GET', 'HEAD'):
+            embed = parse_embed(Pet)
+            etag = stored_row_etag(Pet, pet_id, embed)
+            if etag_matches(etag):
+                return not_modified(etag)
 
-            return jsonify({
+            pet = embed_query(Pet, embed).filter_by(id=pet_id).first()
+            if pet is None:
+                abort(404, {'message': 'Pet not found'})
+            return with_etag(json_response({
                 'success': True,
-            }), 200
+                'pet': pet.format(embed)
+            }), None if embed else row_etag(pet))
+        if request.method in ('PUT', 'PATCH'):
+            return update_one(Pet, pet_id, validate_pet_update, pet_update_values, 'pet')
 
         if request.method == 'DELETE':
-
-            '''
-                adding this to handle one edge case
-            '''
-            if 'delete-owners' not in auth_token['permissions']:
-                abort(403, {'message': "Missing delete permission"})
-
             pet = Pet.query.filter_by(id=pet_id).first()
 
             if pet is None:
                 abort(404, {'message': 'Can not delete, pet does not exist'})
 
-            # delete any appointments first
-            appointments = Appointment.query.filter_by(pet_id=pet.id)
-            if appointments is not None:
-                for appointment in appointments:
-                    appointment.delete()
-
-            pet.delete()
+            deleted_appointments = pet.delete()
 
             return jsonify({
                 'success': True,
+                'deleted': {
+                    'pets': 1,
+                    'appointments': deleted_appointments
+                }
             }), 200
 
     @app.route('/appointments', methods=['GET', 'POST'])
     @requires_auth(['get-appointments', 'post-appointments'])
+    @cached(Appointment)
     def get_appointments(auth_token):
 
-        if request.method == 'GET':
-            appointments = Appointment.query.all()
+        if request.method in ('GET', 'HEAD'):
+            etag = collection_etag(Appointment, date_range(Appointment.date))
+            if etag_matches(etag):
+                return not_modified(etag)
+
+            appointments, next_cursor = list_page(Appointment, date_range(Appointment.date))
 
             if len(appointments) == 0:
                 abort(404, {'message': 'No appointments found'})
-            formatted_appointments = [appointment.format() for appointment in appointments]
-            return jsonify({
+            return with_etag(json_response({
                 'success': True,
-                'appointments': formatted_appointments
-            }), 200
+                'appointments': appointments,
+                'next_cursor': next_cursor
+            }), etag)
 
         if request.method == 'POST':
             appointment_data = request.json
 
-            if 'date' not in appointment_data:
-                abort(422, {'message': 'Appointment must have a date'})
-            if 'time' not in appointment_data:
-                abort(422, {'message': 'Appointment must have a time'})
-            if 'pet_id' not in appointment_data:
-                abort(422, {'message': 'Appointment must have a pet'})
-            if 'owner_id' not in appointment_data:
-                abort(422, {'message': 'Appointment must have an owner'})
+            message = validate_appointment(appointment_data)
+            if message is not None:
+                abort(422, {'message': message})
 
-            new_appointment = Appointment(appointment_data['date'], appointment_data['time'],
-                                          appointment_data['pet_id'], appointment_data['owner_id'])
+            new_appointment = Appointment(**appointment_values(appointment_data))
 
             try:
-                new_appointment.insert()
+                created = new_appointment.insert()
             except exc.IntegrityError:
                 abort(404, {'message': 'Can not create, either pet or owner does not exist'})
 
-
             return jsonify({
-                'success': True
-            }), 204
-
-    @app.route('/appointments/<appointment_id>', methods=['GET', 'PUT', 'DELETE'])
+                'success': True,
+                'appointment': created
+            }), 201, {'Location': url_for('handle_appointment', appointment_id=created['id'])}
+
+    @app.route('/appointments/bulk', methods=['POST'])
+    @requires_auth(['post-appointments'])
+    def bulk_create_appointments(auth_token):
+        return bulk_create(Appointment, validate_appointment, appointment_values,
+                           integrity_message='Can not create, either pet or owner does not exist')
+
+    @app.route('/appointments', methods=['PATCH'])
+    @requires_auth(['put-appointments'])
+    def bulk_update_appointments(auth_token):
+        return bulk_update(Appointment, validate_appointment_update, appointment_update_values, 'appointments')
+
+    @app.route('/appointments/export', methods=['GET'])
+    @requires_auth(['get-appointments'])
+    def export_appointments(auth_token):
+        return export_response(Appointment, 'appointments', date_range(Appointment.date))
+
+    @app.route('/appointments/<appointment_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
     @requires_auth(['get-appointments', 'put-appointments', 'delete-appointments'])
     def handle_appointment(auth_token, appointment_id):
-        if request.method == 'GET':
-            appointment = Appointment.query.filter_by(id=appointment_id).first()
-            if appointment is None:
-                abort(404, {'message': 'Appointment not found'})
-            return jsonify({
-                'success': True,
-                'appointment': appointment.format()
-            }), 200
-        if request.method == 'PUT':
-            update_data = request.json
-
-            if update_data is None:
-                abort(422, {'message': 'Request missing body'})
-            if 'time' not in update_data and 'date' not in update_data:
-                abort(422, {'message': 'Must include a value to update'})
-
-            appointment = Appointment.query.filter_by(id=appointment_id).first()
+        if request.method in ('GET', 'HEAD'):
+            embed = parse_embed(Appointment)
+            etag = stored_row_etag(Appointment, appointment_id, embed)
+            if etag_matches(etag):
+                return not_modified(etag)
 
+            appointment = embed_query(Appointment, embed).filter_by(id=appointment_id).first()
             if appointment is None:
-                abort(404, {'message': 'Can not update, appointment does not exist'})
-            if 'time' in update_data:
-                appointment.time = update_data['time']
-            if 'date' in update_data:
-                appointment.date = update_data['date']
-
-            appointment.update()
-
-            return jsonify({
+                abort(404, {'message': 'Appointment not found'})
+            return with_etag(json_response({
                 'success': True,
-            }), 200
+                'appointment': appointment.format(embed)
+            }), None if embed else row_etag(appointment))
+        if request.method in ('PUT', 'PATCH'):
+            return update_one(Appointment, appointment_id, validate_appointment_update, appointment_update_values,
+                              'appointment')
 
         if request.method == 'DELETE':
-            '''
-               adding this to handle one edge case
-            '''
-            if 'delete-appointments' not in auth_token['permissions']:
-                abort(403, {'message': "Missing delete permission"})
-
             appointment = Appointment.query.filter_by(id=appointment_id).first()
 
             if appointment is None:
@@ -289,8 +318,16 @@ def create_app(test_config=None):
 
             return jsonify({
                 'success': True,
+                'deleted': {
+                    'appointments': 1
+                }
             }), 200
 
+    @app.route('/checkins', methods=['POST'])
+    @requires_auth(['post-appointments'])
+    def post_checkin(auth_token):
+        return create_checkin(auth_token)
+
     @app.errorhandler(404)
     def unprocessable_entity(error):
         return jsonify({
@@ -307,10 +344,16 @@ def create_app(test_config=None):
             "message": error.description['message']
         })
 
-    return app
+    @app.errorhandler(AuthError)
+    def auth_error(error):
+        return jsonify({
+            "success": False,
+            "error": error.status_code,
+            "message": error.error
+        }), error.status_code
 
+    return app
 
-app = create_app()
 
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
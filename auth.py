@@ -1,15 +1,58 @@
+import hashlib
 import json
 import os
+import signal
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from urllib.request import urlopen
 
 from flask import request
 from jose import jwt, exceptions
 
+from metrics import REGISTRY, Histogram
+
 AUTH0_DOMAIN = os.environ['AUTH0_DOMAIN']
 ALGORITHMS = os.environ['ALGORITHMS']
 API_AUDIENCE = os.environ['API_AUDIENCE']
 
+JWKS_URL = os.environ.get('JWKS_URL', f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
+# seconds before the cached keys are considered old and get re-fetched
+JWKS_CACHE_TTL = int(os.environ.get('JWKS_CACHE_TTL', 600))
+# minimum seconds between forced re-fetches when a token has an unknown kid
+JWKS_REFRESH_INTERVAL = int(os.environ.get('JWKS_REFRESH_INTERVAL', 30))
+# how long past the ttl we keep using old keys while the provider can't be reached
+JWKS_STALE_TTL = int(os.environ.get('JWKS_STALE_TTL', 3600))
+# seconds to wait on Auth0 before giving up on a fetch
+JWKS_FETCH_TIMEOUT = float(os.environ.get('JWKS_FETCH_TIMEOUT', 5))
+# refresh the keys from a background thread instead of on the request path
+JWKS_BACKGROUND_REFRESH = os.environ.get('JWKS_BACKGROUND_REFRESH', 'false').lower() in ('1', 'true', 'yes', 'on')
+# offline mode, a JWKS document or PEM public key to verify with instead of fetching from Auth0
+JWT_PUBLIC_KEYS_FILE = os.environ.get('JWT_PUBLIC_KEYS_FILE')
+JWT_PUBLIC_KEYS = os.environ.get('JWT_PUBLIC_KEYS')
+# seconds between checks of the key file's modification time
+JWT_KEYS_CHECK_INTERVAL = float(os.environ.get('JWT_KEYS_CHECK_INTERVAL', 1))
+# how many verified tokens to remember, 0 turns the cache off
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 1024))
+
+# the permission prefix each http method needs, e.g. a DELETE needs delete-*
+METHOD_PERMISSION_PREFIXES = {
+    'GET': 'get',
+    'HEAD': 'get',
+    'POST': 'post',
+    'PUT': 'put',
+    # partial updates need the same permission as full ones
+    'PATCH': 'put',
+    'DELETE': 'delete'
+}
+
+
+# time spent per step: parsing the header, fetching the JWKS and verifying the JWT
+AUTH_SECONDS = Histogram('auth_duration_seconds', 'Time spent authenticating requests, by step',
+                         buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+REGISTRY.add_collector(AUTH_SECONDS.collect)
+
 
 # AuthError Exception
 class AuthError(Exception):
@@ -34,21 +77,308 @@ def get_token_auth_header():
     return header_parts[1]
 
 
-def check_permissions(permission, payload):
+def compile_permissions(permissions):
+    '''
+    Splits a route's permissions into a frozenset per http method
+    '''
+    if isinstance(permissions, str):
+        permissions = [permissions] if permissions else []
+
+    required = {}
+    for method, prefix in METHOD_PERMISSION_PREFIXES.items():
+        required[method] = frozenset(
+            permission for permission in permissions if permission.split('-', 1)[0] == prefix)
+    return required
+
+
+def get_token_permissions(payload):
     if 'permissions' not in payload:
         raise AuthError('Permissions not included in JWT.', 403)
 
-    for user_permission in payload['permissions']:
-        if user_permission in permission:
-            return True
-    raise AuthError('Permission not found.', 403)
+    return frozenset(payload['permissions'])
+
+
+def check_permissions(required, granted):
+    if not required <= granted:
+        raise AuthError('Permission not found.', 403)
+    return True
+
+
+def jwks_keys(jwks):
+    keys = {}
+    for key in jwks['keys']:
+        keys[key['kid']] = {
+            'kty': key['kty'],
+            'kid': key['kid'],
+            'use': key['use'],
+            'n': key['n'],
+            'e': key['e']
+        }
+    return keys
+
+
+def parse_keys(text):
+    '''
+    Keys by kid from a JWKS document, or a PEM public key which is used
+    whatever kid the token names (stored under None)
+    '''
+    text = text.strip()
+    if text.startswith('-----BEGIN'):
+        return {None: text}
+    return jwks_keys(json.loads(text))
+
+
+class TokenCache:
+    '''
+    LRU cache of verified token payloads so a token only goes through the
+    signature check once, entries are dropped once the token's exp has passed
+    '''
+
+    def __init__(self, max_size=TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).digest()
 
+    def get(self, token):
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, token, payload):
+        # tokens without an expiry can't be safely remembered
+        if self.max_size <= 0 or 'exp' not in payload:
+            return
+
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (payload, payload['exp'])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'max_size': self.max_size
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def collect(self):
+        stats = self.stats()
+        yield 'token_cache_hits_total', 'counter', 'Tokens found already verified', [({}, stats['hits'])]
+        yield 'token_cache_misses_total', 'counter', 'Tokens that went through the signature check', \
+            [({}, stats['misses'])]
+        yield 'token_cache_entries', 'gauge', 'Verified tokens remembered', [({}, stats['size'])]
+
+
+token_cache = TokenCache()
+REGISTRY.add_collector(token_cache.collect)
+
+
+class JwksCache:
+    '''
+    Process wide cache of the signing keys published by Auth0, keyed by kid
+    '''
+
+    def __init__(self, url, ttl=JWKS_CACHE_TTL, refresh_interval=JWKS_REFRESH_INTERVAL, stale_ttl=JWKS_STALE_TTL,
+                 timeout=JWKS_FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.stale_ttl = stale_ttl
+        self.keys = {}
+        self.fetched_at = None
+        self.last_attempt = None
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with AUTH_SECONDS.time(step='jwks_fetch'):
+            jsonurl = urlopen(self.url, timeout=self.timeout)
+            jwks = json.loads(jsonurl.read())
+
+        return jwks_keys(jwks)
+
+    def refresh(self, force=False):
+        # with keys in hand only one thread fetches, the others carry on with the current keys
+        if not self.lock.acquire(blocking=not self.keys):
+            return
+        try:
+            now = time.monotonic()
+
+            # another thread may have refreshed while we waited on the lock
+            if not force and not self.is_expired(now):
+                return
+            if self.last_attempt is not None and now - self.last_attempt < self.refresh_interval:
+                return
+
+            self.last_attempt = now
+            try:
+                self.keys = self.fetch()
+                self.fetched_at = now
+            except Exception:
+                # keep serving the old keys for a while if the provider is down
+                if self.fetched_at is None or now - self.fetched_at > self.ttl + self.stale_ttl:
+                    self.keys = {}
+        finally:
+            self.lock.release()
+
+    def is_expired(self, now):
+        return self.fetched_at is None or now - self.fetched_at > self.ttl
+
+    def get_key(self, kid):
+        if self.is_expired(time.monotonic()):
+            self.refresh()
+
+        # the provider may have rotated keys since our last fetch
+        if kid not in self.keys:
+            self.refresh(force=True)
+
+        if not self.keys:
+            raise AuthError('Unable to fetch signing keys', 503)
+
+        return self.keys.get(kid)
+
+    def start_background_refresh(self, interval=None):
+        '''
+        Re-fetches the keys every interval seconds (half the ttl by default)
+        so requests never wait on Auth0, a greenlet under the gevent worker.
+        Threads don't survive a fork, call this in each worker
+        '''
+        interval = interval or self.ttl / 2
+        stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                self.refresh(force=True)
+                stop.wait(interval)
+
+        threading.Thread(target=run, name='jwks-refresh', daemon=True).start()
+        return stop
+
+    def clear(self):
+        with self.lock:
+            self.keys = {}
+            self.fetched_at = None
+            self.last_attempt = None
+
+
+jwks_cache = JwksCache(JWKS_URL)
+
+
+class LocalKeys:
+    '''
+    Signing keys configured locally, so verifying a token needs no network
+    at all. Keys from a file are reloaded when its modification time
+    changes (checked at most every check_interval seconds) or on reload(),
+    which SIGHUP triggers in the gunicorn workers
+    '''
+
+    def __init__(self, path=None, text=None, check_interval=JWT_KEYS_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.keys = {}
+        self.mtime = None
+        self.checked_at = time.monotonic()
+        self.lock = threading.Lock()
+
+        if path is not None:
+            self.reload()
+        else:
+            self.keys = parse_keys(text)
+
+    def reload(self):
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                with open(self.path) as key_file:
+                    keys = parse_keys(key_file.read())
+            except (OSError, ValueError, KeyError):
+                # a missing or half written file leaves the current keys in place
+                return False
+
+            self.keys = keys
+            self.mtime = mtime
+        # tokens verified with a key that has since been removed must be checked again
+        token_cache.clear()
+        return True
+
+    def check_for_changes(self):
+        now = time.monotonic()
+        if self.path is None or now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self.mtime:
+            self.reload()
+
+    def get_key(self, kid):
+        self.check_for_changes()
+
+        if not self.keys:
+            raise AuthError('Unable to load signing keys', 503)
+
+        return self.keys.get(kid, self.keys.get(None))
+
+
+def install_reload_signal(keys):
+    '''
+    kill -HUP <worker pid> reloads the key file without restarting the worker
+    '''
+    signal.signal(signal.SIGHUP, lambda signum, frame: keys.reload())
+
+
+if JWT_PUBLIC_KEYS_FILE or JWT_PUBLIC_KEYS:
+    signing_keys = LocalKeys(path=JWT_PUBLIC_KEYS_FILE, text=JWT_PUBLIC_KEYS)
+else:
+    signing_keys = jwks_cache
+
+
+def set_signing_keys(keys):
+    '''
+    Verifies tokens against keys from now on, a LocalKeys or JwksCache
+    '''
+    global signing_keys
+    signing_keys = keys
+    token_cache.clear()
 
 
 def verify_decode_jwt(token):
-    # GET THE PUBLIC KEY FROM AUTH0
-    jsonurl = urlopen(f'https://{AUTH0_DOMAIN}/.well-known/jwks.json')
-    jwks = json.loads(jsonurl.read())
+    # SKIP THE CRYPTO IF WE HAVE ALREADY VERIFIED THIS TOKEN
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
 
     # GET THE DATA IN THE HEADER
     try:
@@ -57,32 +387,25 @@ def verify_decode_jwt(token):
         raise AuthError('Could not decode JWT token', 400)
 
     # CHOOSE OUR KEY
-    rsa_key = {}
     if 'kid' not in unverified_header:
         raise AuthError('Authorization malformed.', 401)
 
-    for key in jwks['keys']:
-        if key['kid'] == unverified_header['kid']:
-            rsa_key = {
-                'kty': key['kty'],
-                'kid': key['kid'],
-                'use': key['use'],
-                'n': key['n'],
-                'e': key['e']
-            }
+    rsa_key = signing_keys.get_key(unverified_header['kid'])
 
     # Finally, verify!!!
     if rsa_key:
         try:
             # USE THE KEY TO VALIDATE THE JWT
-            payload = jwt.decode(
-                token,
-                rsa_key,
-                algorithms=ALGORITHMS,
-                audience=API_AUDIENCE,
-                issuer='https://' + AUTH0_DOMAIN + '/'
-            )
+            with AUTH_SECONDS.time(step='jwt_decode'):
+                payload = jwt.decode(
+                    token,
+                    rsa_key,
+                    algorithms=ALGORITHMS,
+                    audience=API_AUDIENCE,
+                    issuer='https://' + AUTH0_DOMAIN + '/'
+                )
 
+            token_cache.put(token, payload)
             return payload
 
         except jwt.ExpiredSignatureError:
@@ -99,11 +422,22 @@ def verify_decode_jwt(token):
 
 def requires_auth(permission=''):
     def requires_auth_decorator(f):
+        required_by_method = compile_permissions(permission)
+        needs_permission = any(required_by_method.values())
+
         @wraps(f)
         def wrapper(*args, **kwargs):
-            token = get_token_auth_header()
+            with AUTH_SECONDS.time(step='header'):
+                token = get_token_auth_header()
             payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            granted = get_token_permissions(payload)
+
+            required = required_by_method.get(request.method, frozenset())
+            # the route is protected but nothing grants access to this method
+            if needs_permission and not required:
+                raise AuthError('Permission not found.', 403)
+            check_permissions(required, granted)
+
             return f(payload, *args, **kwargs)
 
         return wrapper
@@ -0,0 +1,124 @@
+'''
+Closed loop load test against a running server: --concurrency clients
+each send GET requests back to back for --duration seconds. With --pid
+the resident memory of that process and its children (the gunicorn
+master and workers) is reported too, to compare worker classes at the
+same memory budget, e.g.
+
+    export JWT_PUBLIC_KEYS_FILE=/tmp/bench-keys.json
+    WORKER_CLASS=sync WEB_CONCURRENCY=8 gunicorn --preload 'app:create_app()' &
+    python bench/load.py --pid $! --concurrency 100
+
+    WORKER_CLASS=gevent WEB_CONCURRENCY=2 gunicorn --preload 'app:create_app()' &
+    python bench/load.py --pid $! --concurrency 100
+
+The token is signed with a fresh local key pair whose JWKS is written to
+JWT_PUBLIC_KEYS_FILE (or --keys-file), which the server reloads on its
+own. The server needs the same AUTH0_DOMAIN and API_AUDIENCE. Set
+VET_TECH_HEADER to send a token of your own instead
+'''
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from local_auth import LocalIssuer, VET_TECH_PERMISSIONS  # noqa: E402
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def process_tree_rss(pid):
+    '''
+    Resident set size in bytes of pid and all of its descendants
+    '''
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        with open(f'/proc/{current}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1]) * 1024
+        for task in os.listdir(f'/proc/{current}/task'):
+            with open(f'/proc/{current}/task/{task}/children') as children:
+                pending.extend(int(child) for child in children.read().split())
+    return total
+
+
+def client(url, headers, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers), timeout=30) as response:
+                response.read()
+        except (HTTPError, OSError):
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def local_token_header(keys_file):
+    issuer = LocalIssuer(os.environ.get('AUTH0_DOMAIN', 'bench.local'), os.environ.get('API_AUDIENCE', 'pet-checkin'))
+    with open(keys_file, 'w') as jwks_file:
+        json.dump(issuer.jwks(), jwks_file)
+    # the server looks at the file's modification time about once a second (JWT_KEYS_CHECK_INTERVAL)
+    time.sleep(1.5)
+    return f'Bearer {issuer.token(VET_TECH_PERMISSIONS)}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000/appointments?limit=50')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--pid', type=int, help='gunicorn master pid, to report memory')
+    parser.add_argument('--keys-file', default=os.environ.get('JWT_PUBLIC_KEYS_FILE',
+                                                              os.path.join(tempfile.gettempdir(), 'bench-keys.json')),
+                        help='where to write the JWKS the server verifies the token with')
+    args = parser.parse_args()
+
+    authorization = os.environ.get('VET_TECH_HEADER') or local_token_header(args.keys_file)
+    headers = {'Authorization': authorization}
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+
+    clients = [threading.Thread(target=client, args=(args.url, headers, deadline, latencies, errors))
+               for _ in range(args.concurrency)]
+    for thread in clients:
+        thread.start()
+
+    peak_rss = 0
+    while any(thread.is_alive() for thread in clients):
+        if args.pid is not None:
+            peak_rss = max(peak_rss, process_tree_rss(args.pid))
+        time.sleep(0.5)
+
+    print(json.dumps({
+        'url': args.url,
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': round(len(latencies) / args.duration, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'peak_rss_mb': round(peak_rss / 1024 / 1024, 1) if args.pid is not None else None
+    }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+'''
+Seeds a database and replays a weighted mix of the requests in
+pet_checkin.postman_collection.json, then prints throughput and
+p50/p95/p99 latency per route as JSON, one line per volume, to diff
+between commits. Tokens are minted locally and verified against a local
+key file, so nothing reaches Auth0. Run from the repo root:
+
+    python bench/replay.py --appointments 1000 100000 --duration 30
+
+Uses a throwaway sqlite file unless DATABASE_URL is set, point it at an
+empty postgres database for real numbers (the tables are recreated).
+Requests go through the Flask test client in process, or to a running
+server with --url (started with the same DATABASE_URL, AUTH0_DOMAIN,
+API_AUDIENCE and the JWT_PUBLIC_KEYS_FILE this prints to stderr).
+--mix takes the path of a json file holding an object of weights like
+{"GET /owners": 10}, routes left out keep their default
+'''
+import argparse
+import datetime
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from load import percentile  # noqa: E402
+
+work_directory = tempfile.mkdtemp()
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(work_directory, "bench.db")}')
+os.environ.setdefault('AUTH0_DOMAIN', 'bench.local')
+os.environ.setdefault('ALGORITHMS', 'RS256')
+os.environ.setdefault('API_AUDIENCE', 'pet-checkin')
+
+from app import create_app  # noqa: E402
+from auth import LocalKeys, set_signing_keys  # noqa: E402
+from local_auth import LocalIssuer, VET_TECH_PERMISSIONS  # noqa: E402
+from models import db, Owner, Pet, Appointment  # noqa: E402
+
+issuer = LocalIssuer(os.environ['AUTH0_DOMAIN'], os.environ['API_AUDIENCE'])
+jwks_path = os.path.join(work_directory, 'jwks.json')
+with open(jwks_path, 'w') as jwks_file:
+    json.dump(issuer.jwks(), jwks_file)
+set_signing_keys(LocalKeys(path=jwks_path))
+
+# relative weights, deletes are left out so the data stays the same size
+DEFAULT_WEIGHTS = {
+    'GET /owners': 10, 'GET /owners/<id>': 15, 'POST /owners': 2, 'PUT /owners/<id>': 2,
+    'GET /pets': 10, 'GET /pets/<id>': 15, 'POST /pets': 2, 'PUT /pets/<id>': 2,
+    'GET /appointments': 20, 'GET /appointments/<id>': 15, 'POST /appointments': 4, 'PUT /appointments/<id>': 3,
+    'DELETE /owners/<id>': 0, 'DELETE /pets/<id>': 0, 'DELETE /appointments/<id>': 0,
+}
+SEED_BATCH_SIZE = 10000
+
+
+def load_collection(path):
+    '''
+    (route, method, path, body) for every request in the postman collection,
+    routes name the id segment <id> the way the weights do
+    '''
+    with open(path) as collection_file:
+        collection = json.load(collection_file)
+
+    requests = []
+    for folder in collection['item']:
+        for item in folder['item']:
+            method = item['request']['method']
+            path = item['request']['url']['raw'].replace('{{base_url}}', '')
+            raw_body = item['request'].get('body', {}).get('raw')
+            route = f'{method} ' + re.sub(r'/\d+$', '/<id>', path)
+            requests.append((route, method, path, json.loads(raw_body) if raw_body else None))
+    return requests
+
+
+def seed(app, appointments):
+    owners = pets = max(1, appointments // 10)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        insert(Owner, ({'name': f'Owner {i}', 'phone': f'555-{i:07d}'} for i in range(owners)), owners)
+        insert(Pet, ({'name': f'Pet {i}', 'species': ('dog', 'cat', 'bird')[i % 3], 'breed': ''}
+                     for i in range(pets)), pets)
+        start = datetime.date(2021, 1, 1)
+        insert(Appointment, ({'date': start + datetime.timedelta(days=i % 730), 'time': datetime.time(8 + i % 10, 0),
+                              'pet_id': 1 + i % pets, 'owner_id': 1 + i % owners} for i in range(appointments)),
+               appointments)
+    return {'owners': owners, 'pets': pets, 'appointments': appointments}
+
+
+def insert(model, rows, count):
+    rows = iter(rows)
+    for _ in range(0, count, SEED_BATCH_SIZE):
+        batch = [row for _, row in zip(range(SEED_BATCH_SIZE), rows)]
+        db.session.execute(model.__table__.insert(), batch)
+        db.session.commit()
+
+
+def pick_request(requests, weights, volumes, rng):
+    route, method, path, body = rng.choices(requests, weights=[weights[request[0]] for request in requests])[0]
+    model = path.split('/')[1]
+    if route.endswith('<id>'):
+        path = f'/{model}/{rng.randint(1, volumes[model])}'
+    if model == 'appointments' and method == 'POST':
+        body = dict(body, pet_id=rng.randint(1, volumes['pets']), owner_id=rng.randint(1, volumes['owners']))
+    return route, method, path, body
+
+
+def in_process_sender(app, headers):
+    client = app.test_client()
+
+    def send(method, path, body):
+        response = client.open(path, method=method, json=body, headers=headers)
+        # the 404 and 422 handlers answer with a 200, the body says whether it worked
+        return response.status_code < 400 and b'"success":false' not in response.data
+
+    return send
+
+
+def http_sender(url, headers):
+    def send(method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(url + path, data=data, method=method,
+                          headers=dict(headers, **({'Content-Type': 'application/json'} if data else {})))
+        try:
+            with urlopen(request, timeout=30) as response:
+                return b'"success":false' not in response.read()
+        except (HTTPError, OSError):
+            return False
+
+    return send
+
+
+def replay(send, requests, weights, volumes, duration, seed_value, results):
+    rng = random.Random(seed_value)
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        route, method, path, body = pick_request(requests, weights, volumes, rng)
+        started = time.perf_counter()
+        ok = send(method, path, body)
+        elapsed = time.perf_counter() - started
+        results.append((route, elapsed, ok))
+
+
+def summarize(results, duration):
+    routes = {}
+    for route in sorted({route for route, _, _ in results}):
+        latencies = [elapsed for name, elapsed, ok in results if name == route and ok]
+        errors = sum(1 for name, _, ok in results if name == route and not ok)
+        routes[route] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'requests_per_sec': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        }
+    return routes
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--appointments', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--url', help='replay against a running server instead of in process')
+    parser.add_argument('--mix', help='path to a json file of route weights, e.g. {"GET /owners": 10}')
+    parser.add_argument('--collection', default=os.path.join(root, 'pet_checkin.postman_collection.json'))
+    parser.add_argument('--seed', type=int, default=0, help='random seed, so runs replay the same requests')
+    args = parser.parse_args()
+
+    weights = dict(DEFAULT_WEIGHTS)
+    if args.mix:
+        with open(args.mix) as mix_file:
+            weights.update(json.load(mix_file))
+    requests = [request for request in load_collection(args.collection) if weights.get(request[0])]
+
+    headers = {'Authorization': f'Bearer {issuer.token(VET_TECH_PERMISSIONS)}'}
+    app = create_app()
+    print(f'JWT_PUBLIC_KEYS_FILE={jwks_path}', file=sys.stderr)
+
+    for appointments in args.appointments:
+        volumes = seed(app, appointments)
+        results = []
+        clients = []
+        for number in range(args.concurrency):
+            send = http_sender(args.url, headers) if args.url else in_process_sender(app, headers)
+            clients.append(threading.Thread(target=replay, args=(
+                send, requests, weights, volumes, args.duration, args.seed + number, results)))
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+
+        with app.app_context():
+            database = db.engine.url.get_backend_name()
+        print(json.dumps({
+            'commit': current_commit(),
+            'database': database,
+            'url': args.url,
+            'volumes': volumes,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'requests_per_sec': round(sum(1 for _, _, ok in results if ok) / args.duration, 1),
+            'routes': summarize(results, args.duration)
+        }))
+
+
+if __name__ == '__main__':
+    main()
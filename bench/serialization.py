@@ -0,0 +1,100 @@
+'''
+Rows/sec for GET /appointments style serialization, before and after the
+serializers module: ORM instances + format() + jsonify against column
+tuples + serializers.dumps. Run from the repo root:
+
+    python bench/serialization.py --rows 10000 100000
+'''
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+database_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{database_path}')
+
+from flask import Flask, jsonify  # noqa: E402
+
+from models import setup_db, Owner, Pet, Appointment  # noqa: E402
+from queries import fetch_page, public_fields  # noqa: E402
+from serializers import dumps, orjson  # noqa: E402
+
+
+def seed(db, rows):
+    db.session.query(Appointment).delete()
+    db.session.query(Pet).delete()
+    db.session.query(Owner).delete()
+    db.session.add(Owner('Bob Ross', '122-344-5666'))
+    db.session.add(Pet('Fifi', 'dog', 'pug'))
+    db.session.commit()
+
+    start = datetime.date(2021, 1, 1)
+    db.session.execute(Appointment.__table__.insert(), [
+        {'date': start + datetime.timedelta(days=i % 365), 'time': datetime.time(9 + i % 8, 0), 'pet_id': 1,
+         'owner_id': 1} for i in range(rows)])
+    db.session.commit()
+
+
+def orm_format_jsonify(db, rows):
+    appointments = Appointment.query.all()
+    body = jsonify({
+        'success': True,
+        'appointments': [appointment.format() for appointment in appointments],
+        'next_cursor': None
+    }).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def tuples_dumps(db, rows):
+    fields = public_fields(Appointment)
+    appointments, next_cursor = fetch_page(Appointment, fields, limit=rows)
+    return dumps({
+        'success': True,
+        'appointments': appointments,
+        'next_cursor': next_cursor
+    })
+
+
+def measure(db, function, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function(db, rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return body, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    db = setup_db(app, os.environ['DATABASE_URL'])
+
+    with app.app_context():
+        db.create_all()
+        for rows in args.rows:
+            seed(db, rows)
+            before, before_seconds = measure(db, orm_format_jsonify, rows, args.repeat)
+            after, after_seconds = measure(db, tuples_dumps, rows, args.repeat)
+            print(json.dumps({
+                'rows': rows,
+                'encoder': 'orjson' if orjson is not None else 'json',
+                'before_rows_per_sec': round(rows / before_seconds),
+                'after_rows_per_sec': round(rows / after_seconds),
+                'speedup': round(before_seconds / after_seconds, 2),
+                'identical_output': before == after
+            }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Cold worker boot, before and after the lazy app factory. Each run is a
+fresh interpreter that imports the app and builds it the way a gunicorn
+worker does. "before" also runs db.create_all() like setup_db used to.
+Uses DATABASE_URL when set (point it at postgres for real numbers),
+otherwise a throwaway sqlite file. Run from the repo root:
+
+    python bench/startup.py --runs 10
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+worker = '''
+import json, sys, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+connections = []
+event.listen(Engine, 'engine_connect', lambda *args: connections.append(1))
+from app import create_app
+from models import db
+app = create_app()
+if sys.argv[1] == 'before':
+    with app.app_context():
+        db.create_all()
+print(json.dumps({'seconds': time.perf_counter() - started, 'connections': len(connections)}))
+'''
+
+
+def boot(mode, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', worker, mode], cwd=root, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output)
+    result['process_seconds'] = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(tempfile.mkdtemp(), "bench.db")}')
+    # auth reads these at import, nothing here talks to Auth0
+    env.setdefault('AUTH0_DOMAIN', 'bench.local')
+    env.setdefault('ALGORITHMS', 'RS256')
+    env.setdefault('API_AUDIENCE', 'pet-checkin')
+    env['PYTHONPATH'] = root
+
+    # warm the OS file cache so the first mode measured isn't penalised
+    boot('after', env)
+
+    for mode in ('before', 'after'):
+        runs = [boot(mode, env) for _ in range(args.runs)]
+        print(json.dumps({
+            'mode': mode,
+            'runs': args.runs,
+            'median_boot_ms': round(statistics.median(run['seconds'] for run in runs) * 1000, 1),
+            'median_process_ms': round(statistics.median(run['process_seconds'] for run in runs) * 1000, 1),
+            'connections_at_boot': max(run['connections'] for run in runs)
+        }))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import json
+import os
+
+from flask import abort, jsonify, request
+from sqlalchemy import exc
+
+from shared_db import db
+
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 500))
+
+
+def parse_bulk_body():
+    '''
+    Reads a json array, or ndjson with one object per line, returns the
+    (index, data) pairs that parsed along with errors for the ones that didn't
+    '''
+    if request.mimetype == 'application/x-ndjson':
+        rows = []
+        errors = []
+        # indexes are line numbers, so blank lines are counted before they're skipped
+        for index, line in enumerate(request.get_data(as_text=True).splitlines()):
+            if not line.strip():
+                continue
+            try:
+                rows.append((index, json.loads(line)))
+            except ValueError:
+                errors.append({'index': index, 'message': 'Row is not valid json'})
+        return rows, errors
+
+    items = request.get_json(silent=True)
+    if not isinstance(items, list):
+        abort(422, {'message': 'Request body must be a list'})
+    return list(enumerate(items)), []
+
+
+def check_foreign_keys(model, batch, message):
+    '''
+    Looks up every referenced id in the batch with one query per foreign key
+    and splits off the rows that point at something that doesn't exist
+    '''
+    missing = set()
+    for foreign_key in model.__table__.foreign_keys:
+        column = foreign_key.parent.name
+        target = foreign_key.column
+
+        wanted = {values[column] for _, values in batch if isinstance(values[column], int)}
+        found = {row[0] for row in db.session.query(target).filter(target.in_(wanted))} if wanted else set()
+
+        for index, values in batch:
+            if values[column] not in found:
+                missing.add(index)
+
+    valid = [(index, values) for index, values in batch if index not in missing]
+    errors = [{'index': index, 'message': message} for index in sorted(missing)]
+    return valid, errors
+
+
+def insert_batch(model, batch, message):
+    statement = model.__table__.insert()
+    try:
+        # one executemany for the whole batch
+        db.session.execute(statement, [values for _, values in batch])
+        db.session.commit()
+        return len(batch), []
+    except exc.IntegrityError:
+        db.session.rollback()
+
+    # something in the batch broke a constraint, insert one by one to find it
+    created = 0
+    errors = []
+    for index, values in batch:
+        try:
+            db.session.execute(statement, values)
+            db.session.commit()
+            created += 1
+        except exc.IntegrityError:
+            db.session.rollback()
+            errors.append({'index': index, 'message': message})
+    return created, errors
+
+
+def bulk_create(model, validate, values, integrity_message='Can not create', batch_size=BULK_BATCH_SIZE):
+    rows, errors = parse_bulk_body()
+
+    valid = []
+    for index, data in rows:
+        message = validate(data)
+        if message is not None:
+            errors.append({'index': index, 'message': message})
+        else:
+            valid.append((index, values(data)))
+
+    created = 0
+    for start in range(0, len(valid), batch_size):
+        batch, batch_errors = check_foreign_keys(model, valid[start:start + batch_size], integrity_message)
+        errors.extend(batch_errors)
+        if batch:
+            batch_created, batch_errors = insert_batch(model, batch, integrity_message)
+            created += batch_created
+            errors.extend(batch_errors)
+
+    return jsonify({
+        'success': len(errors) == 0,
+        'created': created,
+        'errors': sorted(errors, key=lambda error: error['index'])
+    }), 200
@@ -0,0 +1,298 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import Delete, Insert, Update
+
+from queries import parse_embed
+from shared_db import db
+
+# redis is optional, only needed for RESPONSE_CACHE=redis
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryBackend:
+    '''
+    In process LRU bounded by entry count and total body size. Each worker
+    has its own, so writes made by other workers only show up once ttl passes
+    '''
+
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.bumped_at = {}
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self.remove(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value.body) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.size += len(value.body)
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        value, _ = self.entries.pop(key)
+        self.size -= len(value.body)
+
+    def generation(self, table):
+        return self.generations.get(table, 0)
+
+    def bump(self, table):
+        with self.lock:
+            self.generations[table] = self.generations.get(table, 0) + 1
+            self.bumped_at[table] = time.time()
+
+    def last_bump(self, table):
+        return self.bumped_at.get(table)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.size}
+
+
+class RedisBackend:
+    '''
+    Shared by every worker so a write in one invalidates the others right away
+    '''
+
+    def __init__(self, url, ttl, prefix='response-cache:'):
+        if redis is None:
+            raise RuntimeError('RESPONSE_CACHE=redis needs the redis package installed')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.client.get(self.prefix + key)
+        return None if data is None else CachedResponse.loads(data)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value.dumps(), ex=self.ttl)
+
+    def generation(self, table):
+        return int(self.client.get(f'{self.prefix}generation:{table}') or 0)
+
+    def bump(self, table):
+        pipeline = self.client.pipeline()
+        pipeline.incr(f'{self.prefix}generation:{table}')
+        pipeline.set(f'{self.prefix}bumped-at:{table}', time.time())
+        pipeline.execute()
+
+    def last_bump(self, table):
+        bumped_at = self.client.get(f'{self.prefix}bumped-at:{table}')
+        return None if bumped_at is None else float(bumped_at)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def stats(self):
+        return {'entries': None, 'bytes': None}
+
+
+class CachedResponse:
+    def __init__(self, body, status, mimetype, etag):
+        self.body = body
+        self.status = status
+        self.mimetype = mimetype
+        self.etag = etag
+
+    def dumps(self):
+        header = f'{self.status}\n{self.mimetype}\n{self.etag or ""}\n'.encode()
+        return header + self.body
+
+    @classmethod
+    def loads(cls, data):
+        status, mimetype, etag, body = data.split(b'\n', 3)
+        return cls(body, int(status), mimetype.decode(), etag.decode() or None)
+
+    def to_response(self):
+        response = Response(self.body, status=self.status, mimetype=self.mimetype)
+        if self.etag is not None:
+            response.set_etag(self.etag)
+        return response.make_conditional(request)
+
+
+class ResponseCache:
+    def __init__(self, backend, replica_lag=0):
+        self.backend = backend
+        self.replica_lag = replica_lag
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        kind = config['RESPONSE_CACHE']
+        if kind == 'none':
+            return None
+        replica_lag = config.get('RESPONSE_CACHE_REPLICA_LAG', 0)
+        if kind == 'redis':
+            return cls(RedisBackend(config['RESPONSE_CACHE_URL'], config['RESPONSE_CACHE_TTL']), replica_lag)
+        return cls(MemoryBackend(config['RESPONSE_CACHE_SIZE'], config['RESPONSE_CACHE_MAX_BYTES'],
+                                 config['RESPONSE_CACHE_TTL']), replica_lag)
+
+    @staticmethod
+    def tables(model):
+        tables = {model.__tablename__}
+        for name in parse_embed(model):
+            tables.add(getattr(model, name).property.mapper.local_table.name)
+        return tables
+
+    def key(self, model, auth_token):
+        '''
+        The route, query args and permissions, plus the write generation of
+        every table the response reads from so any write makes it unreachable
+        '''
+        generations = ','.join(f'{table}:{self.backend.generation(table)}' for table in sorted(self.tables(model)))
+        permissions = ','.join(sorted(auth_token.get('permissions', [])))
+        # encoded, so a value containing & or = can't pass for another set of args
+        args = urlencode(sorted(request.args.items(multi=True)))
+        raw = f'{request.path}?{args}|{permissions}|{generations}'
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def cached(self, model):
+        '''
+        Caches successful GET (and HEAD) responses of the view, put it below requires_auth
+        '''
+        def cached_decorator(f):
+            @wraps(f)
+            def wrapper(auth_token, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return f(auth_token, *args, **kwargs)
+
+                key = self.key(model, auth_token)
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return entry.to_response()
+
+                self.misses += 1
+                response = current_app.make_response(f(auth_token, *args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed \
+                        and not self.may_be_stale(self.tables(model)):
+                    etag, _ = response.get_etag()
+                    self.backend.set(key, CachedResponse(response.get_data(), 200, response.mimetype, etag))
+                return response
+
+            return wrapper
+
+        return cached_decorator
+
+    def may_be_stale(self, tables):
+        '''
+        A replica read soon after a write to one of the tables may not have
+        the write yet, and would be stored under the new generation's key
+        '''
+        if not self.replica_lag or getattr(db.session(), 'replica', None) is None:
+            return False
+
+        now = time.time()
+        for table in tables:
+            bumped_at = self.backend.last_bump(table)
+            if bumped_at is not None and now - bumped_at < self.replica_lag:
+                return True
+        return False
+
+    def invalidate(self, table):
+        self.backend.bump(table)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else None,
+            **self.backend.stats()
+        }
+
+    def collect(self):
+        stats = self.stats()
+        yield 'response_cache_hits_total', 'counter', 'Responses served from the cache', [({}, stats['hits'])]
+        yield 'response_cache_misses_total', 'counter', 'Responses that had to be built', [({}, stats['misses'])]
+        yield 'response_cache_hit_ratio', 'gauge', 'Share of lookups served from the cache', \
+            [({}, stats['hit_ratio'])]
+        yield 'response_cache_entries', 'gauge', 'Responses held in the cache', [({}, stats['entries'])]
+        yield 'response_cache_bytes', 'gauge', 'Size of the cached response bodies', [({}, stats['bytes'])]
+
+
+'''
+Invalidation, every INSERT, UPDATE or DELETE run through any engine (ORM
+flushes included) bumps the generation of its table right away and again
+once the transaction commits, so a read that raced the write can't leave
+stale data behind
+'''
+
+
+def current_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('response_cache')
+
+
+@event.listens_for(Engine, 'after_execute')
+def track_writes(conn, clauseelement, multiparams, params, result):
+    if not isinstance(clauseelement, (Insert, Update, Delete)):
+        return
+
+    cache = current_cache()
+    if cache is None:
+        return
+
+    table = clauseelement.table.name
+    cache.invalidate(table)
+    conn.info.setdefault('written_tables', set()).add(table)
+
+
+@event.listens_for(Engine, 'commit')
+def invalidate_on_commit(conn):
+    tables = conn.info.pop('written_tables', set())
+    cache = current_cache()
+    if cache is None:
+        return
+    for table in tables:
+        cache.invalidate(table)
+
+
+@event.listens_for(Engine, 'rollback')
+def forget_on_rollback(conn):
+    conn.info.pop('written_tables', None)
@@ -0,0 +1,78 @@
+'''
+POST /checkins books a walk-in in one request: the owner and pet are
+looked up by id or created, then the appointment is added, all in a
+single transaction so a failure part way leaves nothing behind
+'''
+from flask import abort, jsonify, request, url_for
+from sqlalchemy import exc
+
+from auth import check_permissions, get_token_permissions
+from models import Owner, Pet, Appointment
+from shared_db import db
+from validators import validate_checkin, owner_values, pet_values, appointment_values, parse_id
+
+
+def required_permissions(checkin_data):
+    # creating a new owner or pet needs the same permission as posting one
+    required = {'post-appointments'}
+    if 'id' not in checkin_data['owner']:
+        required.add('post-owners')
+    if 'id' not in checkin_data['pet']:
+        required.add('post-pets')
+    return frozenset(required)
+
+
+def find_or_add(model, data, values):
+    '''
+    Returns the id and whether the row was created, or None for the id when
+    an existing row was asked for and doesn't exist. New rows are flushed
+    to get their id but not committed
+    '''
+    if 'id' in data:
+        found = db.session.query(model.id).filter_by(id=parse_id(data['id'])).scalar()
+        return found, False
+
+    instance = model(**values(data))
+    db.session.add(instance)
+    db.session.flush()
+    return instance.id, True
+
+
+def create_checkin(payload):
+    checkin_data = request.json
+
+    message = validate_checkin(checkin_data)
+    if message is not None:
+        abort(422, {'message': message})
+    check_permissions(required_permissions(checkin_data), get_token_permissions(payload))
+
+    # one unit, whatever goes wrong part way is rolled back
+    try:
+        owner_id, owner_created = find_or_add(Owner, checkin_data['owner'], owner_values)
+        pet_id, pet_created = find_or_add(Pet, checkin_data['pet'], pet_values)
+        if owner_id is None or pet_id is None:
+            db.session.rollback()
+            abort(404, {'message': f'Can not check in, {"owner" if owner_id is None else "pet"} does not exist'})
+
+        appointment = Appointment(**appointment_values(dict(checkin_data['appointment'], pet_id=pet_id,
+                                                            owner_id=owner_id)))
+        db.session.add(appointment)
+        db.session.flush()
+        # read before the commit expires it, which would cost a SELECT
+        appointment_id = appointment.id
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(422, {'message': 'Can not check in, the owner, pet or appointment has an invalid value'})
+
+    return jsonify({
+        'success': True,
+        'owner_id': owner_id,
+        'pet_id': pet_id,
+        'appointment_id': appointment_id,
+        'created': {
+            'owner': owner_created,
+            'pet': pet_created,
+            'appointment': True
+        }
+    }), 201, {'Location': url_for('handle_appointment', appointment_id=appointment_id)}
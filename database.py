@@ -0,0 +1,256 @@
+'''
+Engine and connection pool settings, read from the environment unless the
+app config (create_app's test_config) already sets them
+'''
+import os
+import threading
+import time
+
+from flask import has_request_context, request
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+from metrics import REGISTRY, Histogram
+
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_config():
+    return {
+        'DB_POOL_SIZE': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'DB_MAX_OVERFLOW': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'DB_POOL_TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        # seconds, recycles connections before server or load balancer idle timeouts drop them
+        'DB_POOL_RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'DB_POOL_PRE_PING': env_flag('DB_POOL_PRE_PING', 'true'),
+        # milliseconds, 0 leaves the server default
+        'DB_STATEMENT_TIMEOUT': int(os.environ.get('DB_STATEMENT_TIMEOUT', 0)),
+        # PgBouncer does the pooling, see engine_options
+        'DB_PGBOUNCER': env_flag('DB_PGBOUNCER', 'false'),
+        # logged with their route, 0 turns either off
+        'DB_SLOW_QUERY_MS': int(os.environ.get('DB_SLOW_QUERY_MS', 200)),
+        'DB_REPEATED_QUERY_LIMIT': int(os.environ.get('DB_REPEATED_QUERY_LIMIT', 10)),
+        # comma separated, GET requests read from these when set
+        'DATABASE_REPLICA_URLS': [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url],
+        'DB_REPLICA_CHECK_INTERVAL': int(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5)),
+        'DB_REPLICA_RETRY_AFTER': int(os.environ.get('DB_REPLICA_RETRY_AFTER', 30)),
+    }
+
+
+CHECKOUT_SECONDS = Histogram('db_pool_checkout_seconds', 'Time spent waiting for a pooled connection',
+                             buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+REGISTRY.add_collector(CHECKOUT_SECONDS.collect)
+
+
+class TimedQueuePool(QueuePool):
+    '''
+    QueuePool that records how long each checkout waited for a connection
+    '''
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+'''
+Fork safety, with gunicorn --preload the app is created before the workers
+fork. Nothing connects at that point, but should a connection get opened
+in the master anyway a worker must never reuse it, so checkouts from a
+different process throw it away and the pool opens a new one
+'''
+
+
+@event.listens_for(TimedQueuePool, 'connect')
+def remember_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+
+@event.listens_for(TimedQueuePool, 'checkout')
+def check_pid(dbapi_connection, connection_record, connection_proxy):
+    pid = os.getpid()
+    if connection_record.info['pid'] != pid:
+        # dropped without closing, closing would end the session for the process that opened it
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError(
+            f'Connection belongs to pid {connection_record.info["pid"]}, checked out in pid {pid}')
+
+
+def engine_options(config, database_uri):
+    '''
+    Options for create_engine. With DB_PGBOUNCER the connections are not
+    pooled here at all, PgBouncer in transaction mode hands out server
+    connections per transaction, so session level settings can't be used
+    (psycopg2 never uses server side prepared statements, so nothing to
+    turn off there)
+    '''
+    backend = make_url(database_uri).get_backend_name()
+    is_postgres = backend == 'postgresql'
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+
+    if config['DB_PGBOUNCER']:
+        options['poolclass'] = NullPool
+        if is_postgres and config['DB_STATEMENT_TIMEOUT']:
+            # not a create_engine argument, build_engine takes it back out
+            options['local_statement_timeout'] = config['DB_STATEMENT_TIMEOUT']
+    else:
+        options.update({
+            'poolclass': TimedQueuePool,
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+        })
+        if is_postgres and config['DB_STATEMENT_TIMEOUT']:
+            options['connect_args'] = {'options': f'-c statement_timeout={config["DB_STATEMENT_TIMEOUT"]}'}
+        if backend == 'sqlite':
+            # pooled sqlite connections get checked out by whichever thread comes next
+            options['connect_args'] = {'check_same_thread': False}
+
+    return options
+
+
+def build_engine(url, options):
+    options = dict(options)
+    local_statement_timeout = options.pop('local_statement_timeout', None)
+    engine = create_engine(url, **options)
+    if local_statement_timeout:
+        set_local_statement_timeout(engine, local_statement_timeout)
+    return engine
+
+
+def set_local_statement_timeout(engine, timeout):
+    '''
+    PgBouncer rejects the startup options parameter, so in that mode the
+    timeout is set at the start of every transaction instead
+    '''
+    @event.listens_for(engine, 'begin')
+    def begin(conn):
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(f'SET LOCAL statement_timeout = {int(timeout)}')
+        finally:
+            cursor.close()
+
+
+def pool_collector(db, app):
+    '''
+    Collector reporting the app's pool usage, nothing when pooling is off
+    '''
+    def collect():
+        pool = db.get_engine(app).pool
+        if not isinstance(pool, QueuePool):
+            return
+        yield 'db_pool_size', 'gauge', 'Connections the pool keeps open', [({}, pool.size())]
+        yield 'db_pool_checked_out', 'gauge', 'Connections currently in use', [({}, pool.checkedout())]
+        yield 'db_pool_overflow', 'gauge', 'Connections open beyond the pool size', [({}, pool.overflow())]
+
+    return collect
+
+
+class ReplicaSet:
+    '''
+    Read replicas handed out round robin. A replica is checked with a
+    SELECT 1 at most every check_interval seconds when it is picked, and
+    one that fails the check or drops a connection is skipped for
+    retry_after seconds
+    '''
+
+    def __init__(self, engines, check_interval=5, retry_after=30):
+        self.engines = engines
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.checked_at = {engine: None for engine in engines}
+        self.down_until = {engine: 0 for engine in engines}
+        self.next = 0
+        self.lock = threading.Lock()
+
+        for engine in engines:
+            event.listen(engine, 'handle_error', self.on_error)
+
+    @classmethod
+    def from_config(cls, config):
+        options = engine_options(config, config['SQLALCHEMY_DATABASE_URI'])
+        engines = [build_engine(url, options) for url in config['DATABASE_REPLICA_URLS']]
+        return cls(engines, config['DB_REPLICA_CHECK_INTERVAL'], config['DB_REPLICA_RETRY_AFTER'])
+
+    def choose(self):
+        '''
+        The next healthy replica, or None when they are all down
+        '''
+        with self.lock:
+            start = self.next
+            self.next = (self.next + 1) % len(self.engines)
+
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if self.is_healthy(engine):
+                return engine
+        return None
+
+    def is_healthy(self, engine):
+        now = time.monotonic()
+        if now < self.down_until[engine]:
+            return False
+
+        checked_at = self.checked_at[engine]
+        if checked_at is not None and now - checked_at < self.check_interval:
+            return True
+
+        self.checked_at[engine] = now
+        try:
+            with engine.connect() as connection:
+                connection.execute('SELECT 1')
+        except exc.DBAPIError:
+            self.mark_down(engine)
+            return False
+        return True
+
+    def mark_down(self, engine):
+        self.down_until[engine] = time.monotonic() + self.retry_after
+        self.checked_at[engine] = None
+
+    def on_error(self, context):
+        if context.is_disconnect and context.engine is not None:
+            self.mark_down(context.engine)
+
+    def collect(self):
+        now = time.monotonic()
+        samples = [({'replica': engine.url.host or engine.url.database}, int(now >= self.down_until[engine]))
+                   for engine in self.engines]
+        yield 'db_replica_up', 'gauge', 'Whether reads are being sent to the replica', samples
+
+
+class RoutingSession(SignallingSession):
+    '''
+    Sends the reads of GET and HEAD requests to a replica when the app has
+    any. Everything else goes to the primary, and so does the rest of the
+    session once it has written, so a request always reads its own writes
+    '''
+
+    def __init__(self, db, **options):
+        super().__init__(db, **options)
+        self.replica = None
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+
+        if not self.wrote and self.replica is None and self.reads_from_replica():
+            self.replica = self.app.extensions['replicas'].choose()
+
+        if not self.wrote and self.replica is not None:
+            return self.replica
+        return super().get_bind(mapper, clause)
+
+    def reads_from_replica(self):
+        return has_request_context() and request.method in ('GET', 'HEAD') \
+            and self.app.extensions.get('replicas') is not None
@@ -0,0 +1,70 @@
+import hashlib
+
+from flask import Response, request
+from sqlalchemy import func
+
+from queries import list_filters, parse_embed
+from shared_db import db
+
+
+def row_etag(row):
+    return f'{row.__tablename__}-{row.id}-{row.version}'
+
+
+def stored_row_etag(model, row_id, embed=()):
+    '''
+    Reads only the version column, and only when the client sent
+    If-None-Match, so a matching tag is answered without loading the row.
+    Embedded rows have their own versions so those get no tag here
+    '''
+    if embed or not request.if_none_match:
+        return None
+
+    version = db.session.query(model.version).filter(model.id == row_id).scalar()
+    if version is None:
+        return None
+    return f'{model.__tablename__}-{row_id}-{version}'
+
+
+def collection_etag(model, criteria=()):
+    '''
+    Tags the filtered collection by its row count and newest updated_at.
+    An insert or delete changes the count and an update moves updated_at,
+    max() is answered from the updated_at index but the count still visits
+    every matching row (an index only scan on postgres), so this costs one
+    pass over the filtered rows per list GET
+    '''
+    if parse_embed(model):
+        return None
+
+    table = model.__table__
+    summary = db.session.query(
+        func.count(),
+        func.max(table.c.updated_at)
+    ).select_from(table).filter(*list_filters(model), *criteria).one()
+
+    key = f'{table.name}|{"|".join(str(value) for value in summary)}|{request.query_string.decode()}'
+    return f'{table.name}-{hashlib.sha1(key.encode()).hexdigest()}'
+
+
+def etag_matches(etag):
+    return etag is not None and etag in request.if_none_match
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response, etag=None):
+    '''
+    Sets etag on the response, without one the tag is a hash of the body
+    which still saves sending it back when nothing changed
+    '''
+    if etag is None:
+        response.add_etag()
+        return response.make_conditional(request)
+
+    response.set_etag(etag)
+    return response
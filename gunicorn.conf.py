@@ -0,0 +1,31 @@
+'''
+Gunicorn settings, loaded automatically from the working directory.
+WORKER_CLASS=gevent serves each request on a greenlet, so a worker waiting
+on postgres or Auth0 keeps handling other requests and a handful of
+workers give the concurrency that took dozens of sync ones. The worker
+count is WEB_CONCURRENCY, which gunicorn reads itself
+'''
+import os
+
+worker_class = os.environ.get('WORKER_CLASS', 'sync')
+# concurrent requests per gevent worker, keep DB_POOL_SIZE + DB_MAX_OVERFLOW in line with it
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 100))
+
+if worker_class == 'gevent':
+    # before the app is preloaded so its locks, sockets and threads are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+    # psycopg2 is a C extension, this makes it wait on the gevent hub instead of blocking
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+
+def post_worker_init(worker):
+    import auth
+
+    if isinstance(auth.signing_keys, auth.LocalKeys):
+        # after gunicorn's own handlers, so HUP to a worker reloads the keys instead of restarting it
+        auth.install_reload_signal(auth.signing_keys)
+    elif worker_class == 'gevent' or auth.JWKS_BACKGROUND_REFRESH:
+        auth.jwks_cache.start_background_refresh()
@@ -0,0 +1,121 @@
+'''
+Per request metrics: latency by route and method, status codes, and how
+many queries each request ran and how long they took. Queries are timed
+with cursor events on every engine, so this costs a couple of
+perf_counter calls per statement.
+
+The same events log slow statements (DB_SLOW_QUERY_MS) and, once the
+request is done, any statement that ran more than DB_REPEATED_QUERY_LIMIT
+times in it, which is usually an N+1 from a loop over related rows
+'''
+import logging
+import re
+import time
+from collections import Counter as StatementCounter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import REGISTRY, Counter, Histogram
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Time to build the response, by route and method')
+REQUESTS = Counter('http_requests_total', 'Responses sent, by route, method and status code')
+DB_QUERIES = Histogram('db_queries_per_request', 'Statements run by a request, by route',
+                       buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500))
+DB_SECONDS = Histogram('db_duration_seconds_per_request', 'Time a request spent waiting on the database, by route')
+
+for metric in (REQUEST_SECONDS, REQUESTS, DB_QUERIES, DB_SECONDS):
+    REGISTRY.add_collector(metric.collect)
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'\s+')
+IN_LIST = re.compile(r'IN \((?:\?|%\(\w+\)s|, )+\)')
+
+
+def route_label():
+    # the url rule rather than the path, so /owners/1 and /owners/2 share a series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def start_request():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+    g.db_statements = StatementCounter()
+
+
+def record_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+
+    route = route_label()
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method)
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    DB_QUERIES.observe(g.db_queries, route=route)
+    DB_SECONDS.observe(g.db_seconds, route=route)
+
+    limit = current_app.config.get('DB_REPEATED_QUERY_LIMIT')
+    if limit:
+        for statement, count in g.db_statements.items():
+            if count > limit:
+                logger.warning('Statement ran %d times in %s %s, likely an N+1: %s',
+                               count, request.method, route, statement)
+    return response
+
+
+def statement_shape(statement):
+    # parameters are already placeholders, only whitespace and IN lists differ between runs
+    return IN_LIST.sub('IN (...)', WHITESPACE.sub(' ', statement).strip())
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop('query_started')
+    if not has_request_context() or 'db_queries' not in g:
+        return
+
+    g.db_queries += 1
+    g.db_seconds += elapsed
+    shape = statement_shape(statement)
+    g.db_statements[shape] += 1
+
+    slow_query_ms = current_app.config.get('DB_SLOW_QUERY_MS')
+    if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+        logger.warning('Slow query, %.1fms in %s %s: %s', elapsed * 1000, request.method, route_label(), shape)
+
+
+@contextmanager
+def count_queries():
+    '''
+    Collects every statement run on any engine inside the block
+    '''
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement_shape(statement))
+
+    event.listen(Engine, 'after_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'after_cursor_execute', record)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    '''
+    Test helper, fails listing the statements when the block runs more than limit
+    '''
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(f'{len(statements)} queries run, expected at most {limit}:\n' + '\n'.join(statements))
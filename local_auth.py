@@ -0,0 +1,72 @@
+'''
+Local stand in for Auth0: an RSA key pair, the JWKS document for it and
+tokens signed with it, so the tests and benchmarks never call the real
+provider
+'''
+import base64
+import json
+import os
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+VET_TECH_PERMISSIONS = ['get-appointments', 'get-owners', 'get-pets', 'post-appointments', 'post-owners',
+                        'post-pets', 'put-appointments', 'put-owners', 'put-pets']
+VET_ADMIN_PERMISSIONS = VET_TECH_PERMISSIONS + ['delete-appointments', 'delete-owners', 'delete-pets']
+
+
+def b64_int(value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+
+class LocalIssuer:
+    def __init__(self, domain, audience, kid='local'):
+        self.domain = domain
+        self.audience = audience
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def jwks(self):
+        numbers = self.private_key.public_key().public_numbers()
+        return {'keys': [{'kty': 'RSA', 'kid': self.kid, 'use': 'sig', 'n': b64_int(numbers.n),
+                          'e': b64_int(numbers.e)}]}
+
+    def private_pem(self):
+        return self.private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                              serialization.NoEncryption()).decode()
+
+    def token(self, permissions, lifetime=86400):
+        now = int(time.time())
+        claims = {
+            'iss': f'https://{self.domain}/',
+            'aud': self.audience,
+            'sub': 'local|bench',
+            'iat': now,
+            'exp': now + lifetime,
+            'permissions': permissions
+        }
+        return jwt.encode(claims, self.private_pem(), algorithm='RS256', headers={'kid': self.kid})
+
+
+_local_issuer = None
+
+
+def local_issuer():
+    '''
+    One issuer for the whole process, installed as the app's signing keys
+    the first time it's asked for
+    '''
+    import auth
+
+    global _local_issuer
+    if _local_issuer is None:
+        _local_issuer = LocalIssuer(os.environ['AUTH0_DOMAIN'], os.environ['API_AUDIENCE'])
+        auth.set_signing_keys(auth.LocalKeys(text=json.dumps(_local_issuer.jwks())))
+    return _local_issuer
+
+
+def auth_header(permissions):
+    return {'Authorization': f'Bearer {local_issuer().token(permissions)}'}
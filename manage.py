@@ -1,14 +1,21 @@
 from flask_script import Manager
 from flask_migrate import Migrate, MigrateCommand
 
-from app import app
+from app import create_app
 from models import db
 
+app = create_app()
 migrate = Migrate(app, db)
 manager = Manager(app)
 
 manager.add_command('db', MigrateCommand)
 
 
+@manager.command
+def create_db():
+    '''Creates any missing tables, for a fresh database without migrations'''
+    db.create_all()
+
+
 if __name__ == '__main__':
-    manager.run()
\ No newline at end of file
+    manager.run()
@@ -0,0 +1,128 @@
+'''
+Small Prometheus text format registry. Collectors are functions that
+return (name, type, help, samples) tuples, samples being (labels, value)
+pairs, or (sample name, labels, value) for ones like histogram buckets,
+and are read every time /metrics is scraped
+'''
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{str(value)}"' for key, value in sorted(labels.items()))
+    return '{' + pairs + '}'
+
+
+def format_value(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def add_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+        return collector
+
+    def collect(self):
+        with self.lock:
+            collectors = list(self.collectors)
+        for collector in collectors:
+            yield from collector()
+
+    def render(self, *others, labels=None):
+        '''
+        labels are added to every sample, e.g. the worker that answered
+        '''
+        lines = []
+        for registry in (self,) + others:
+            for name, metric_type, help_text, samples in registry.collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for sample in samples:
+                    sample_name, sample_labels, value = sample if len(sample) == 3 else (name,) + tuple(sample)
+                    if labels:
+                        sample_labels = dict(sample_labels, **labels)
+                    lines.append(f'{sample_name}{format_labels(sample_labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        yield self.name, 'counter', self.help_text, [(dict(key), value) for key, value in values]
+
+
+class Histogram:
+    '''
+    Cumulative histogram per label set, observe() is cheap enough for hot paths
+    '''
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # one count per bucket plus +Inf, then the sum
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def collect(self):
+        with self.lock:
+            series = {key: list(values) for key, values in self.series.items()}
+
+        samples = []
+        for key, values in sorted(series.items()):
+            labels = dict(key)
+            count = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), values):
+                count += bucket_count
+                samples.append((f'{self.name}_bucket', {**labels, 'le': bound}, count))
+            samples.append((f'{self.name}_count', labels, count))
+            samples.append((f'{self.name}_sum', labels, values[-1]))
+        yield self.name, 'histogram', self.help_text, samples
+
+
+# process wide metrics, each app also keeps its own registry for app bound ones
+REGISTRY = Registry()
@@ -0,0 +1,58 @@
+"""baseline tables
+
+Revision ID: 3f1c2a9b7d10
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # databases set up before migrations existed already have these tables
+    # from db.create_all(), only create what is missing
+    existing_tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if 'owners' not in existing_tables:
+        op.create_table(
+            'owners',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('phone', sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'pets' not in existing_tables:
+        op.create_table(
+            'pets',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(), nullable=False),
+            sa.Column('species', sa.String(), nullable=False),
+            sa.Column('breed', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'appointments' not in existing_tables:
+        op.create_table(
+            'appointments',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('owner_id', sa.Integer(), nullable=False),
+            sa.Column('pet_id', sa.Integer(), nullable=False),
+            sa.Column('date', sa.String(), nullable=False),
+            sa.Column('time', sa.String(), nullable=False),
+            sa.ForeignKeyConstraint(['owner_id'], ['owners.id']),
+            sa.ForeignKeyConstraint(['pet_id'], ['pets.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('appointments')
+    op.drop_table('pets')
+    op.drop_table('owners')
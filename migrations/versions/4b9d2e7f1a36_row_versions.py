@@ -0,0 +1,41 @@
+"""add version and updated_at to owners, pets and appointments
+
+Revision ID: 4b9d2e7f1a36
+Revises: e1b3f6a08c24
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b9d2e7f1a36'
+down_revision = 'e1b3f6a08c24'
+branch_labels = None
+depends_on = None
+
+tables = ['owners', 'pets', 'appointments']
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # sqlite can't add a column defaulting to now(), it has to copy the table
+    recreate = 'always' if bind.dialect.name == 'sqlite' else 'auto'
+
+    for table in tables:
+        # db.create_all() builds these for new databases
+        if 'version' in {column['name'] for column in inspector.get_columns(table)}:
+            continue
+        with op.batch_alter_table(table, recreate=recreate) as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                                          server_default=sa.func.now()))
+
+
+def downgrade():
+    for table in tables:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
@@ -0,0 +1,36 @@
+"""index appointments by owner, pet and date
+
+Revision ID: 8a4e6c1d2b57
+Revises: 3f1c2a9b7d10
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4e6c1d2b57'
+down_revision = '3f1c2a9b7d10'
+branch_labels = None
+depends_on = None
+
+indexes = {
+    'ix_appointments_owner_id': ['owner_id'],
+    'ix_appointments_pet_id': ['pet_id'],
+    'ix_appointments_date_time': ['date', 'time'],
+}
+
+
+def upgrade():
+    # db.create_all() builds these for new databases, skip the ones it already made
+    existing_indexes = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('appointments')}
+
+    for name, columns in indexes.items():
+        if name not in existing_indexes:
+            op.create_index(name, 'appointments', columns, unique=False)
+
+
+def downgrade():
+    for name in indexes:
+        op.drop_index(name, table_name='appointments')
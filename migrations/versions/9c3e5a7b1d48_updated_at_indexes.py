@@ -0,0 +1,34 @@
+"""index updated_at, which the collection ETags take the max of
+
+Revision ID: 9c3e5a7b1d48
+Revises: 4b9d2e7f1a36
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3e5a7b1d48'
+down_revision = '4b9d2e7f1a36'
+branch_labels = None
+depends_on = None
+
+tables = ['owners', 'pets', 'appointments']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table in tables:
+        name = f'ix_{table}_updated_at'
+        # db.create_all() builds these for new databases
+        if name in {index['name'] for index in inspector.get_indexes(table)}:
+            continue
+        op.create_index(name, table, ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in tables:
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
@@ -0,0 +1,54 @@
+"""store appointment date and time as DATE and TIME
+
+Revision ID: c5d7e2f94a13
+Revises: 8a4e6c1d2b57
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d7e2f94a13'
+down_revision = '8a4e6c1d2b57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    # db.create_all() builds new databases with DATE and TIME already
+    types = {column['name']: column['type'] for column in sa.inspect(bind).get_columns('appointments')}
+    convert_date = not isinstance(types['date'], sa.Date)
+    convert_time = not isinstance(types['time'], sa.Time)
+    if not convert_date and not convert_time:
+        return
+
+    if bind.dialect.name == 'postgresql':
+        # existing rows hold either ISO dates or the US style 12/31/2021
+        if convert_date:
+            op.alter_column('appointments', 'date', type_=sa.Date(), existing_nullable=False,
+                            postgresql_using="CASE WHEN date ~ '^\\d{4}-' THEN date::date "
+                                             "ELSE to_date(date, 'MM/DD/YYYY') END")
+        if convert_time:
+            op.alter_column('appointments', 'time', type_=sa.Time(), existing_nullable=False,
+                            postgresql_using='time::time')
+    else:
+        with op.batch_alter_table('appointments') as batch_op:
+            if convert_date:
+                batch_op.alter_column('date', type_=sa.Date(), existing_nullable=False)
+            if convert_time:
+                batch_op.alter_column('time', type_=sa.Time(), existing_nullable=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.alter_column('appointments', 'date', type_=sa.String(), existing_nullable=False,
+                        postgresql_using="to_char(date, 'YYYY-MM-DD')")
+        op.alter_column('appointments', 'time', type_=sa.String(), existing_nullable=False,
+                        postgresql_using="to_char(time, 'HH24:MI')")
+    else:
+        with op.batch_alter_table('appointments') as batch_op:
+            batch_op.alter_column('date', type_=sa.String(), existing_nullable=False)
+            batch_op.alter_column('time', type_=sa.String(), existing_nullable=False)
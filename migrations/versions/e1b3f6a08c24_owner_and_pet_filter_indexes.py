@@ -0,0 +1,43 @@
+"""index the owner and pet columns the list endpoints filter on
+
+Revision ID: e1b3f6a08c24
+Revises: c5d7e2f94a13
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b3f6a08c24'
+down_revision = 'c5d7e2f94a13'
+branch_labels = None
+depends_on = None
+
+# table, index name, column, postgres operator class for prefix searches
+indexes = [
+    ('owners', 'ix_owners_name', 'name', 'text_pattern_ops'),
+    ('owners', 'ix_owners_phone', 'phone', 'text_pattern_ops'),
+    ('pets', 'ix_pets_name', 'name', 'text_pattern_ops'),
+    ('pets', 'ix_pets_species', 'species', None),
+    ('pets', 'ix_pets_breed', 'breed', None),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    for table, name, column, ops in indexes:
+        # db.create_all() builds these for new databases
+        if name in {index['name'] for index in inspector.get_indexes(table)}:
+            continue
+        if ops is None:
+            op.create_index(name, table, [column], unique=False)
+        else:
+            op.create_index(name, table, [column], unique=False, postgresql_ops={column: ops})
+
+
+def downgrade():
+    for table, name, column, ops in indexes:
+        op.drop_index(name, table_name=table)
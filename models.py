@@ -1,15 +1,76 @@
 from shared_db import db
+from database import ReplicaSet, database_config, engine_options
+import datetime
 import os
 
 
-def setup_db(app, database_uri=os.environ['DATABASE_URL']):
+def setup_db(app, database_uri=None):
+    '''
+    Only configures the app, no connection is made until the first query.
+    The schema is created with `python manage.py create_db` or migrations
+    '''
+    for key, value in database_config().items():
+        app.config.setdefault(key, value)
+    database_uri = database_uri or app.config.get('SQLALCHEMY_DATABASE_URI') or os.environ['DATABASE_URL']
     app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config, database_uri)
     db.app = app
     db.init_app(app)
-    db.create_all()
+    app.extensions['replicas'] = ReplicaSet.from_config(app.config) if app.config['DATABASE_REPLICA_URLS'] else None
     return db
 
+
+'''
+Dates and times are ISO 8601, the US style 12/31/2021 dates older
+clients send are still accepted. These raise ValueError on bad input
+'''
+
+
+def parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid date: {value}')
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return datetime.datetime.strptime(value, '%m/%d/%Y').date()
+
+
+def parse_time(value):
+    if isinstance(value, datetime.time):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid time: {value}')
+    try:
+        return datetime.time.fromisoformat(value)
+    except ValueError:
+        return datetime.datetime.strptime(value, '%H:%M').time()
+
+
+def format_date(value):
+    return value.isoformat()
+
+
+def format_time(value):
+    return value.strftime('%H:%M')
+
+
+def insert(instance):
+    '''
+    Adds and commits the instance, returning it formatted. The flush gets
+    the id back from the INSERT (with RETURNING on postgres) and the
+    instance is formatted before the commit expires it, so no SELECT is
+    needed to build the response
+    '''
+    db.session.add(instance)
+    db.session.flush()
+    created = instance.format()
+    db.session.commit()
+    return created
+
+
 '''
 Owner
 '''
@@ -21,27 +82,47 @@ class Owner(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
     phone = db.Column(db.String, nullable=False)
+    # bumped on every update, these back the ETags on the GET endpoints
+    version = db.Column(db.Integer, nullable=False, server_default='1', onupdate=db.literal_column('version') + 1)
+    # indexed so the collection ETag reads max(updated_at) without a scan
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now(),
+                           onupdate=db.func.now(), index=True)
+
+    # text_pattern_ops lets postgres use these for prefix searches
+    __table_args__ = (
+        db.Index('ix_owners_name', 'name', postgresql_ops={'name': 'text_pattern_ops'}),
+        db.Index('ix_owners_phone', 'phone', postgresql_ops={'phone': 'text_pattern_ops'}),
+    )
+
+    # appointments are removed with a single statement in delete()
+    appointments = db.relationship('Appointment', back_populates='owner', passive_deletes=True,
+                                   order_by='Appointment.id')
 
     def __init__(self, name, phone):
         self.name = name
         self.phone = phone
 
     def insert(self):
-        db.session.add(self)
-        db.session.commit()
+        return insert(self)
 
     def update(self):
         db.session.commit()
 
     def delete(self):
+        # the owner's appointments go in the same transaction, returns how many
+        appointments = Appointment.query.filter_by(owner_id=self.id).delete(synchronize_session=False)
         db.session.delete(self)
         db.session.commit()
+        return appointments
 
-    def format(self):
-        return {
+    def format(self, embed=()):
+        owner = {
             'id': self.id,
             'name': self.name,
             'phone': self.phone}
+        if 'appointments' in embed:
+            owner['appointments'] = [appointment.format() for appointment in self.appointments]
+        return owner
 
 
 '''
@@ -54,8 +135,22 @@ class Pet(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
-    species = db.Column(db.String, nullable=False)
-    breed = db.Column(db.String)
+    species = db.Column(db.String, nullable=False, index=True)
+    breed = db.Column(db.String, index=True)
+    # bumped on every update, these back the ETags on the GET endpoints
+    version = db.Column(db.Integer, nullable=False, server_default='1', onupdate=db.literal_column('version') + 1)
+    # indexed so the collection ETag reads max(updated_at) without a scan
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now(),
+                           onupdate=db.func.now(), index=True)
+
+    # text_pattern_ops lets postgres use this for prefix searches
+    __table_args__ = (
+        db.Index('ix_pets_name', 'name', postgresql_ops={'name': 'text_pattern_ops'}),
+    )
+
+    # appointments are removed with a single statement in delete()
+    appointments = db.relationship('Appointment', back_populates='pet', passive_deletes=True,
+                                   order_by='Appointment.id')
 
     def __init__(self, name, species, breed=""):
         self.name = name
@@ -63,22 +158,27 @@ class Pet(db.Model):
         self.breed = breed
 
     def insert(self):
-        db.session.add(self)
-        db.session.commit()
+        return insert(self)
 
     def update(self):
         db.session.commit()
 
     def delete(self):
+        # the pet's appointments go in the same transaction, returns how many
+        appointments = Appointment.query.filter_by(pet_id=self.id).delete(synchronize_session=False)
         db.session.delete(self)
         db.session.commit()
+        return appointments
 
-    def format(self):
-        return {
+    def format(self, embed=()):
+        pet = {
             'id': self.id,
             'name': self.name,
             'species': self.species,
             'breed': self.breed}
+        if 'appointments' in embed:
+            pet['appointments'] = [appointment.format() for appointment in self.appointments]
+        return pet
 
     '''
     Appointment 
@@ -89,20 +189,32 @@ class Appointment(db.Model):
     __tablename__ = 'appointments'
 
     id = db.Column(db.Integer, primary_key=True)
-    owner_id = db.Column(db.Integer, db.ForeignKey('owners.id'), nullable=False)
-    pet_id = db.Column(db.Integer, db.ForeignKey('pets.id'), nullable=False)
-    date = db.Column(db.String, nullable=False)
-    time = db.Column(db.String, nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('owners.id'), nullable=False, index=True)
+    pet_id = db.Column(db.Integer, db.ForeignKey('pets.id'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    # bumped on every update, these back the ETags on the GET endpoints
+    version = db.Column(db.Integer, nullable=False, server_default='1', onupdate=db.literal_column('version') + 1)
+    # indexed so the collection ETag reads max(updated_at) without a scan
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, server_default=db.func.now(),
+                           onupdate=db.func.now(), index=True)
+
+    # also serves lookups on date alone since it is the leading column
+    __table_args__ = (
+        db.Index('ix_appointments_date_time', 'date', 'time'),
+    )
+
+    pet = db.relationship('Pet', back_populates='appointments')
+    owner = db.relationship('Owner', back_populates='appointments')
 
     def __init__(self, date, time, pet_id, owner_id):
-        self.date = date
-        self.time = time
+        self.date = parse_date(date)
+        self.time = parse_time(time)
         self.pet_id = pet_id
         self.owner_id = owner_id
 
     def insert(self):
-        db.session.add(self)
-        db.session.commit()
+        return insert(self)
 
     def update(self):
         db.session.commit()
@@ -111,11 +223,16 @@ class Appointment(db.Model):
         db.session.delete(self)
         db.session.commit()
 
-    def format(self):
-        return {
+    def format(self, embed=()):
+        appointment = {
             'id': self.id,
-            'date': self.date,
-            'time': self.time,
+            'date': format_date(self.date),
+            'time': format_time(self.time),
             'pet_id': self.pet_id,
             'owner_id': self.owner_id}
+        if 'pet' in embed:
+            appointment['pet'] = self.pet.format()
+        if 'owner' in embed:
+            appointment['owner'] = self.owner.format()
+        return appointment
 
@@ -0,0 +1,279 @@
+import os
+
+from flask import Response, abort, request, stream_with_context
+from sqlalchemy import Date, Time
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import format_date, format_time, parse_date
+from serializers import dumps
+from shared_db import db
+
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+# rows pulled from the server side cursor, and written to the client, at a time
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+
+def parse_positive_int(name, default=None):
+    value = request.args.get(name)
+    if value is None:
+        return default
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        abort(422, {'message': f'{name} must be a positive integer'})
+    return number
+
+
+# bookkeeping columns that are never part of a response
+HIDDEN_COLUMNS = {'version', 'updated_at'}
+
+
+def public_fields(model):
+    return [name for name in model.__table__.columns.keys() if name not in HIDDEN_COLUMNS]
+
+
+def parse_fields(model):
+    '''
+    Reads ?fields=a,b from the query string, defaults to every public column
+    '''
+    columns = public_fields(model)
+    if 'fields' not in request.args:
+        return columns
+
+    fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+    if len(fields) == 0:
+        abort(422, {'message': 'fields must name at least one field'})
+    for field in fields:
+        if field not in columns:
+            abort(422, {'message': f'Unknown field: {field}'})
+    return fields
+
+
+def column_formatter(column):
+    if isinstance(column.type, Date):
+        return format_date
+    if isinstance(column.type, Time):
+        return format_time
+    return None
+
+
+def row_formatter(model, fields):
+    '''
+    Builds the function that turns a tuple of column values into the same
+    dict the model's format() gives
+    '''
+    formatters = [column_formatter(model.__table__.c[field]) for field in fields]
+    if not any(formatters):
+        return lambda values: dict(zip(fields, values))
+
+    def format_row(values):
+        return {
+            field: value if formatter is None or value is None else formatter(value)
+            for field, formatter, value in zip(fields, formatters, values)}
+
+    return format_row
+
+
+def parse_date_arg(name):
+    try:
+        return parse_date(request.args[name])
+    except ValueError:
+        abort(422, {'message': f'{name} must be a date like 2021-12-31'})
+
+
+def date_range(column):
+    '''
+    Turns ?from=&to= into criteria on column, both ends are inclusive
+    '''
+    criteria = []
+    if 'from' in request.args:
+        criteria.append(column >= parse_date_arg('from'))
+    if 'to' in request.args:
+        criteria.append(column <= parse_date_arg('to'))
+    return criteria
+
+
+def equals(column, name):
+    return column == request.args[name]
+
+
+def equals_id(column, name):
+    try:
+        return column == int(request.args[name])
+    except ValueError:
+        abort(422, {'message': f'{name} must be an integer'})
+
+
+def starts_with(column, name):
+    # autoescape keeps % and _ in the value literal, the prefix still uses the index
+    return column.startswith(request.args[name], autoescape=True)
+
+
+# the query string filters each list endpoint accepts, all of them are indexed
+FILTERS = {
+    'owners': {
+        'name': starts_with,
+        'phone': starts_with
+    },
+    'pets': {
+        'name': starts_with,
+        'species': equals,
+        'breed': equals
+    },
+    'appointments': {
+        'owner_id': equals_id,
+        'pet_id': equals_id
+    }
+}
+
+
+def list_filters(model):
+    criteria = []
+    for name, build in FILTERS.get(model.__tablename__, {}).items():
+        if name in request.args:
+            criteria.append(build(model.__table__.c[name], name))
+    return criteria
+
+
+# relationships each endpoint can add with ?embed=, and how to load them so
+# the whole response takes a fixed number of queries
+EMBEDS = {
+    'owners': {
+        'appointments': selectinload
+    },
+    'pets': {
+        'appointments': selectinload
+    },
+    'appointments': {
+        'pet': joinedload,
+        'owner': joinedload
+    }
+}
+
+
+def parse_embed(model):
+    if 'embed' not in request.args:
+        return []
+
+    allowed = EMBEDS.get(model.__tablename__, {})
+    embed = [name.strip() for name in request.args['embed'].split(',') if name.strip()]
+    for name in embed:
+        if name not in allowed:
+            abort(422, {'message': f'Unknown embed: {name}'})
+    return embed
+
+
+def embed_query(model, embed):
+    loaders = EMBEDS.get(model.__tablename__, {})
+    return model.query.options(*[loaders[name](getattr(model, name)) for name in embed])
+
+
+def fetch_embedded_page(model, embed, fields, after=None, limit=PAGE_SIZE, criteria=()):
+    '''
+    Same as fetch_page but through the ORM so related rows can be eager loaded
+    '''
+    query = embed_query(model, embed).filter(*criteria)
+    if after is not None:
+        query = query.filter(model.id > after)
+
+    items = query.order_by(model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1].id
+
+    keep = set(fields) | set(embed)
+    return [{key: value for key, value in item.format(embed).items() if key in keep} for item in items], next_cursor
+
+
+def fetch_page(model, fields, after=None, limit=PAGE_SIZE, criteria=()):
+    '''
+    Keyset pagination on id, only the requested columns are selected
+    '''
+    key = model.__table__.c.id
+    columns = [model.__table__.c[field] for field in fields]
+    format_row = row_formatter(model, fields)
+
+    query = db.session.query(key, *columns).filter(*criteria)
+    if after is not None:
+        query = query.filter(key > after)
+
+    # grab one extra row to know if there is another page
+    rows = query.order_by(key).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0]
+
+    return [format_row(row[1:]) for row in rows], next_cursor
+
+
+def list_page(model, criteria=()):
+    fields = parse_fields(model)
+    embed = parse_embed(model)
+    after = parse_positive_int('after')
+    limit = min(parse_positive_int('limit', PAGE_SIZE), MAX_PAGE_SIZE)
+    criteria = list_filters(model) + list(criteria)
+
+    if embed:
+        return fetch_embedded_page(model, embed, fields, after, limit, criteria)
+    return fetch_page(model, fields, after, limit, criteria)
+
+
+def iter_rows(model, fields, batch_size=EXPORT_BATCH_SIZE, criteria=()):
+    '''
+    Reads the whole table through a server side cursor, batch_size rows at a time
+    '''
+    key = model.__table__.c.id
+    columns = [model.__table__.c[field] for field in fields]
+    format_row = row_formatter(model, fields)
+
+    query = db.session.query(*columns).filter(*criteria).order_by(key) \
+        .execution_options(stream_results=True).yield_per(batch_size)
+    for row in query:
+        yield format_row(row)
+
+
+def iter_chunks(rows, separator, batch_size=EXPORT_BATCH_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row, newline=False))
+        if len(chunk) == batch_size:
+            yield separator.join(chunk)
+            chunk = []
+    if chunk:
+        yield separator.join(chunk)
+
+
+def generate_json(name, rows):
+    yield b'{"' + name.encode() + b'":['
+    first = True
+    for chunk in iter_chunks(rows, b','):
+        yield chunk if first else b',' + chunk
+        first = False
+    yield b'],"success":true}\n'
+
+
+def generate_ndjson(rows):
+    for chunk in iter_chunks(rows, b'\n'):
+        yield chunk + b'\n'
+
+
+def export_response(model, name, criteria=()):
+    '''
+    Streams every row of the table as json (default) or ?format=ndjson
+    '''
+    export_format = request.args.get('format', 'json')
+    if export_format not in ('json', 'ndjson'):
+        abort(422, {'message': 'format must be json or ndjson'})
+
+    rows = iter_rows(model, parse_fields(model), criteria=list_filters(model) + list(criteria))
+    if export_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson(rows)), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json(name, rows)), mimetype='application/json')
@@ -0,0 +1,29 @@
+import json
+
+from flask import Response
+
+# orjson is optional, everything falls back to the standard library encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data, newline=True):
+    '''
+    Encodes data to the exact bytes flask's jsonify gives: sorted keys,
+    compact separators, non ascii characters escaped and a trailing newline
+    '''
+    if orjson is not None:
+        options = orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE if newline else orjson.OPT_SORT_KEYS
+        body = orjson.dumps(data, option=options)
+        # orjson always writes utf-8, fall back when there is something to escape
+        if body.isascii():
+            return body
+
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return (body + '\n' if newline else body).encode()
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
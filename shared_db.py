@@ -1,3 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import orm
 
-db = SQLAlchemy()
+from database import RoutingSession, build_engine
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        return build_engine(sa_url, engine_opts)
+
+
+db = RoutingSQLAlchemy()
@@ -6,16 +6,14 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import text as sa_text
 
 from app import create_app
-from models import setup_db, Appointment, Pet, Owner
+from instrumentation import assert_max_queries
+from local_auth import auth_header, VET_ADMIN_PERMISSIONS, VET_TECH_PERMISSIONS
+from models import db, setup_db, Appointment, Pet, Owner
 
 
-vet_tech_header = {
-    'Authorization': os.environ['VET_TECH_HEADER']
-}
+vet_tech_header = auth_header(VET_TECH_PERMISSIONS)
 
-vet_admin_header = {
-    'Authorization': os.environ['VET_ADMIN_HEADER']
-}
+vet_admin_header = auth_header(VET_ADMIN_PERMISSIONS)
 
 
 def expected_404_builder(message):
@@ -48,6 +46,8 @@ class AppointmentsEndpoints(unittest.TestCase):
             self.db.init_app(self.app)
             self.db.drop_all()
             self.db.create_all()
+            # the app doesn't create the schema itself
+            db.create_all()
 
     def tearDown(self):
         # remove any data between tests
@@ -60,7 +60,7 @@ class AppointmentsEndpoints(unittest.TestCase):
                     sa_text('''TRUNCATE TABLE pets RESTART IDENTITY CASCADE ''').execution_options(
                         autocommit=True))
                 self.db.engine.execute(
-                    sa_text('''TRUNCATE TABLE appointments RESTART IDENTITY CASCADE ''').execution_options(
+                    sa_text('''TRUNCATE TABLE owners RESTART IDENTITY CASCADE ''').execution_options(
                         autocommit=True))
             except:
                 self.db.session.rollback()
@@ -72,7 +72,7 @@ class AppointmentsEndpoints(unittest.TestCase):
     def test_get_appointments__returns_appointments(self):
         Pet('Fifi', "dog", 'pug').insert()
         Owner('Bob Ross', '122-344-5666').insert()
-        Appointment('12/12/2021', '10:00', 1, 1).insert()
+        Appointment('2021-12-12', '10:00', 1, 1).insert()
 
         res = self.client().get('/appointments', headers=vet_tech_header)
 
@@ -81,7 +81,7 @@ class AppointmentsEndpoints(unittest.TestCase):
         self.assertTrue(data['success'])
         appointments = data['appointments']
         self.assertEqual(len(appointments), 1)
-        self.assertEqual(appointments[0], {'id': 1, 'pet_id': 1, 'owner_id': 1, 'time': '10:00', 'date': '12/12/2021'})
+        self.assertEqual(appointments[0], {'id': 1, 'pet_id': 1, 'owner_id': 1, 'time': '10:00', 'date': '2021-12-12'})
 
     def test_get_appointments__no_appointments_in_database__returns_404_error(self):
         res = self.client().get('/appointments', headers=vet_tech_header)
@@ -90,12 +90,102 @@ class AppointmentsEndpoints(unittest.TestCase):
 
         self.assertEqual(expected_404_builder('No appointments found'), actual_response)
 
+    def test_export_appointments__streams_every_appointment_as_json(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '11:00', 1, 1).insert()
+
+        res = self.client().get('/appointments/export', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual([appointment['id'] for appointment in data['appointments']], [1, 2])
+
+    def test_export_appointments__ndjson_format__streams_one_appointment_per_line(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '11:00', 1, 1).insert()
+
+        res = self.client().get('/appointments/export?format=ndjson', headers=vet_tech_header)
+
+        lines = res.data.decode().splitlines()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(json.loads(lines[1]), {'id': 2, 'pet_id': 1, 'owner_id': 1, 'time': '11:00', 'date': '2022-01-10'})
+        self.assertEqual(len(lines), 2)
+
+    def test_get_appointments__date_range_passed_in__returns_appointments_in_range(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-30', '10:00', 1, 1).insert()
+            Appointment('2021-12-31', '10:00', 1, 1).insert()
+            Appointment('2022-01-01', '09:30', 1, 1).insert()
+            Appointment('2022-01-02', '10:00', 1, 1).insert()
+
+        res = self.client().get('/appointments?from=2021-12-31&to=2022-01-01', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([appointment['id'] for appointment in data['appointments']], [2, 3])
+
+    def test_get_appointments__pet_id_passed_in__returns_only_that_pets_appointments(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Pet('Tom', "cat", 'tabby').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-30', '10:00', 1, 1).insert()
+            Appointment('2021-12-31', '10:00', 2, 1).insert()
+            Appointment('2022-01-01', '09:30', 2, 1).insert()
+
+        res = self.client().get('/appointments?pet_id=2&owner_id=1', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([appointment['id'] for appointment in data['appointments']], [2, 3])
+
+    def test_get_appointments__embed_passed_in__returns_pet_and_owner(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-30', '10:00', 1, 1).insert()
+
+        # pet and owner are joined in, not loaded per appointment
+        with assert_max_queries(2):
+            res = self.client().get('/appointments?embed=pet,owner', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['appointments'][0], {'id': 1, 'pet_id': 1, 'owner_id': 1, 'time': '10:00',
+                                                   'date': '2021-12-30',
+                                                   'pet': {'id': 1, 'name': 'Fifi', 'species': 'dog', 'breed': 'pug'},
+                                                   'owner': {'id': 1, 'name': 'Bob Ross', 'phone': '122-344-5666'}})
+
+    def test_get_appointments__unknown_embed__returns_422_error(self):
+        res = self.client().get('/appointments?embed=vet', headers=vet_tech_header)
+
+        actual_response = json.loads(res.data)
+
+        self.assertEqual(expected_422_builder('Unknown embed: vet'), actual_response)
+
+    def test_get_appointments__invalid_date_range__returns_422_error(self):
+        res = self.client().get('/appointments?from=tomorrow', headers=vet_tech_header)
+
+        actual_response = json.loads(res.data)
+
+        self.assertEqual(expected_422_builder('from must be a date like 2021-12-31'), actual_response)
+
     def test_get_appointment__returns_appointment_with_matching_id(self):
         with self.app.app_context():
             Pet('Fifi', "dog", 'pug').insert()
             Owner('Bob Ross', '122-344-5666').insert()
-            Appointment('12/12/2021', '10:00', 1, 1).insert()
-            Appointment('1/10/2022', '10:00', 1, 1).insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '10:00', 1, 1).insert()
 
         res = self.client().get('/appointments/2', headers=vet_tech_header)
 
@@ -103,7 +193,7 @@ class AppointmentsEndpoints(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertTrue(data['success'])
         appointment = data['appointment']
-        self.assertEqual(appointment, {'id': 2, 'pet_id': 1, 'owner_id': 1, 'time': '10:00', 'date': '1/10/2022'})
+        self.assertEqual(appointment, {'id': 2, 'pet_id': 1, 'owner_id': 1, 'time': '10:00', 'date': '2022-01-10'})
 
     def test_get_appointment__appointment_not_in_database__returns_404_error(self):
         res = self.client().get('/appointments/100', headers=vet_tech_header)
@@ -119,14 +209,16 @@ class AppointmentsEndpoints(unittest.TestCase):
 
         request_body = {
             'time': "10:00",
-            'date': '1/1/2022',
+            'date': '2022-01-01',
             'pet_id': 1,
             'owner_id': 1
         }
 
         post_res = self.client().post('/appointments', json=request_body, headers=vet_tech_header)
 
-        self.assertEqual(post_res.status_code, 204)
+        self.assertEqual(post_res.status_code, 201)
+        self.assertEqual(json.loads(post_res.data)['appointment'], dict(request_body, id=1))
+        self.assertTrue(post_res.headers['Location'].endswith('/appointments/1'))
 
         res = self.client().get('/appointments', headers=vet_tech_header)
         data = json.loads(res.data)
@@ -137,10 +229,117 @@ class AppointmentsEndpoints(unittest.TestCase):
                                            'owner_id': request_body['owner_id'],
                                            'pet_id': request_body['pet_id']})
 
+    def test_bulk_add_appointments__reports_rows_that_could_not_be_created(self):
+        Pet('Fifi', "dog", 'pug').insert()
+        Owner('Bob Ross', '122-344-5666').insert()
+
+        request_body = [
+            {'time': '10:00', 'date': '2022-01-01', 'pet_id': 1, 'owner_id': 1},
+            {'time': '11:00', 'date': '2022-01-01', 'pet_id': 1},
+            {'time': '12:00', 'date': '2022-01-01', 'pet_id': 7, 'owner_id': 1},
+            {'time': '13:00', 'date': '2022-01-01', 'pet_id': 1, 'owner_id': 1}
+        ]
+
+        res = self.client().post('/appointments/bulk', json=request_body, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(data['success'])
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(data['errors'], [
+            {'index': 1, 'message': 'Appointment must have an owner'},
+            {'index': 2, 'message': 'Can not create, either pet or owner does not exist'}
+        ])
+
+        res = self.client().get('/appointments', headers=vet_tech_header)
+        data = json.loads(res.data)
+        self.assertEqual([appointment['time'] for appointment in data['appointments']], ['10:00', '13:00'])
+
+    def test_bulk_add_appointments__ndjson_body__adds_every_row(self):
+        Pet('Fifi', "dog", 'pug').insert()
+        Owner('Bob Ross', '122-344-5666').insert()
+
+        request_body = '\n'.join(json.dumps(row) for row in [
+            {'time': '10:00', 'date': '2022-01-01', 'pet_id': 1, 'owner_id': 1},
+            {'time': '11:00', 'date': '2022-01-01', 'pet_id': 1, 'owner_id': 1}
+        ])
+
+        res = self.client().post('/appointments/bulk', data=request_body, content_type='application/x-ndjson',
+                                 headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['created'], 2)
+
+    def test_bulk_add_appointments__numeric_string_ids__created_like_the_single_post(self):
+        Pet('Fifi', "dog", 'pug').insert()
+        Owner('Bob Ross', '122-344-5666').insert()
+
+        request_body = [
+            {'time': '10:00', 'date': '2022-01-01', 'pet_id': '1', 'owner_id': '1'},
+            {'time': '11:00', 'date': '2022-01-01', 'pet_id': 'one', 'owner_id': 1}
+        ]
+
+        res = self.client().post('/appointments/bulk', json=request_body, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['errors'], [{'index': 1, 'message': 'Appointment pet_id must be a number'}])
+
+    def test_bulk_add_appointments__ndjson_with_blank_lines__error_index_is_the_line_number(self):
+        Pet('Fifi', "dog", 'pug').insert()
+        Owner('Bob Ross', '122-344-5666').insert()
+
+        request_body = '\n'.join([
+            json.dumps({'time': '10:00', 'date': '2022-01-01', 'pet_id': 1, 'owner_id': 1}),
+            '',
+            json.dumps({'time': '11:00', 'date': '2022-01-01', 'pet_id': 1})
+        ])
+
+        res = self.client().post('/appointments/bulk', data=request_body, content_type='application/x-ndjson',
+                                 headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(data['created'], 1)
+        self.assertEqual(data['errors'], [{'index': 2, 'message': 'Appointment must have an owner'}])
+
+    def test_add_appointment__us_style_date_passed_in__stores_iso_date(self):
+        Pet('Fifi', "dog", 'pug').insert()
+        Owner('Bob Ross', '122-344-5666').insert()
+
+        request_body = {
+            'time': "9:15",
+            'date': '1/31/2022',
+            'pet_id': 1,
+            'owner_id': 1
+        }
+
+        self.client().post('/appointments', json=request_body, headers=vet_tech_header)
+
+        res = self.client().get('/appointments/1', headers=vet_tech_header)
+        data = json.loads(res.data)
+        self.assertEqual(data['appointment']['date'], '2022-01-31')
+        self.assertEqual(data['appointment']['time'], '09:15')
+
+    def test_add_appointment__invalid_date__return_a_422(self):
+
+        request_body = {
+            'time': '10:00',
+            'date': '31/31/2022',
+            'pet_id': 1,
+            'owner_id': 1
+        }
+
+        post_res = self.client().post('/appointments', json=request_body, headers=vet_tech_header)
+
+        actual_response = json.loads(post_res.data)
+
+        self.assertEqual(expected_422_builder('Appointment date must be a date like 2021-12-31'), actual_response)
+
     def test_add_appointment__add_a_appointment_that_without_a_time__return_a_422(self):
 
         request_body = {
-            'date': '1/1/2022',
+            'date': '2022-01-01',
             'pet_id': 1,
             'owner_id': 1
         }
@@ -169,7 +368,7 @@ class AppointmentsEndpoints(unittest.TestCase):
 
         request_body = {
             'time': '10:00',
-            'date': '1/1/2022',
+            'date': '2022-01-01',
             'owner_id': 1
         }
 
@@ -183,7 +382,7 @@ class AppointmentsEndpoints(unittest.TestCase):
 
         request_body = {
             'time': '10:00',
-            'date': '1/1/2022',
+            'date': '2022-01-01',
             'pet_id': 1
         }
 
@@ -197,11 +396,11 @@ class AppointmentsEndpoints(unittest.TestCase):
         with self.app.app_context():
             Pet('Fifi', "dog", 'pug').insert()
             Owner('Bob Ross', '122-344-5666').insert()
-            Appointment('12/12/2021', '10:00', 1, 1).insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
 
         res = self.client().put('/appointments/1', json={
             'time': "11:00",
-            'date': '1/1/2022',
+            'date': '2022-01-01',
             'pet_id': 2,
             'owner_id': 2
         }, headers=vet_tech_header)
@@ -214,7 +413,7 @@ class AppointmentsEndpoints(unittest.TestCase):
 
         data = json.loads(res.data)
         appointment = data['appointment']
-        self.assertEqual(appointment, {'date': '1/1/2022',
+        self.assertEqual(appointment, {'date': '2022-01-01',
                                        'time': "11:00",
                                        'id': 1,
                                        'owner_id': 1,
@@ -235,12 +434,61 @@ class AppointmentsEndpoints(unittest.TestCase):
         actual_response = json.loads(res.data)
         self.assertEqual(expected_422_builder('Must include a value to update'), actual_response)
 
+    def test_patch_appointment__updates_in_one_statement_and_returns_the_row(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+
+        # the UPDATE, plus reading the row back where there is no RETURNING
+        with assert_max_queries(2):
+            res = self.client().patch('/appointments/1', json={'time': '11:30'}, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['appointment'], {'id': 1, 'pet_id': 1, 'owner_id': 1, 'time': '11:30',
+                                               'date': '2021-12-12'})
+
+    def test_patch_appointment__appointment_not_in_database__returns_404_error(self):
+        res = self.client().patch('/appointments/400', json={'time': '11:30'}, headers=vet_tech_header)
+        actual_response = json.loads(res.data)
+        self.assertEqual(expected_404_builder('Can not update, appointment does not exist'), actual_response)
+
+    def test_bulk_patch_appointments__moves_every_listed_appointment(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            Owner('Bob Ross', '122-344-5666').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2021-12-12', '11:00', 1, 1).insert()
+            Appointment('2021-12-13', '10:00', 1, 1).insert()
+
+        res = self.client().patch('/appointments', json={'ids': [1, 2, 400], 'values': {'date': '2021-12-20'}},
+                                  headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual(data['not_found'], [400])
+        self.assertEqual([appointment['date'] for appointment in data['appointments']], ['2021-12-20', '2021-12-20'])
+        res = self.client().get('/appointments/3', headers=vet_tech_header)
+        self.assertEqual(json.loads(res.data)['appointment']['date'], '2021-12-13')
+
+    def test_bulk_patch_appointments__ids_missing__returns_422_error(self):
+        res = self.client().patch('/appointments', json={'values': {'date': '2021-12-20'}}, headers=vet_tech_header)
+        actual_response = json.loads(res.data)
+        self.assertEqual(expected_422_builder('Request must have a list of ids'), actual_response)
+
+    def test_bulk_patch_appointments__caller_without_put_permission__returns_403_error(self):
+        res = self.client().patch('/appointments', json={'ids': [1], 'values': {'date': '2021-12-20'}},
+                                  headers=auth_header(['get-appointments']))
+        self.assertEqual(res.status_code, 403)
+
     def test_delete_appointment__deletes_appointment_from_database(self):
         with self.app.app_context():
             Pet('Fifi', "dog", 'pug').insert()
             Owner('Bob Ross', '122-344-5666').insert()
-            Appointment('12/12/2021', '10:00', 1, 1).insert()
-            Appointment('1/10/2022', '10:00', 1, 1).insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '10:00', 1, 1).insert()
 
         res = self.client().get('/appointments', headers=vet_admin_header)
         data = json.loads(res.data)
@@ -269,6 +517,120 @@ class AppointmentsEndpoints(unittest.TestCase):
         self.assertEqual(res.status_code, 403)
 
 
+    '''
+    Check-in Tests
+    '''
+
+    def test_post_checkin__new_owner_and_pet__creates_all_three_in_one_transaction(self):
+        checkin = {
+            'owner': {'name': 'Bob Ross', 'phone': '122-344-5666'},
+            'pet': {'name': 'Fifi', 'species': 'dog'},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        with assert_max_queries(3):
+            res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data, {'success': True, 'owner_id': 1, 'pet_id': 1, 'appointment_id': 1,
+                                'created': {'owner': True, 'pet': True, 'appointment': True}})
+        res = self.client().get('/appointments/1', headers=vet_tech_header)
+        self.assertEqual(json.loads(res.data)['appointment'],
+                         {'id': 1, 'pet_id': 1, 'owner_id': 1, 'time': '10:00', 'date': '2021-12-12'})
+
+    def test_post_checkin__existing_owner__books_with_that_owner(self):
+        with self.app.app_context():
+            Owner('Bob Ross', '122-344-5666').insert()
+        checkin = {
+            'owner': {'id': 1},
+            'pet': {'name': 'Fifi', 'species': 'dog'},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(data['owner_id'], 1)
+        self.assertEqual(data['created'], {'owner': False, 'pet': True, 'appointment': True})
+
+    def test_post_checkin__owner_id_is_a_boolean__returns_422_error(self):
+        checkin = {
+            'owner': {'id': True},
+            'pet': {'id': 1},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        self.assertEqual(expected_422_builder('Owner id must be a number'), json.loads(res.data))
+
+    def test_post_checkin__numeric_string_ids__books_with_those_rows(self):
+        with self.app.app_context():
+            Owner('Bob Ross', '122-344-5666').insert()
+            Pet('Fifi', "dog", 'pug').insert()
+        checkin = {
+            'owner': {'id': '1'},
+            'pet': {'id': '1'},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((data['owner_id'], data['pet_id']), (1, 1))
+
+    def test_post_checkin__pet_does_not_exist__returns_404_and_creates_nothing(self):
+        checkin = {
+            'owner': {'name': 'Bob Ross', 'phone': '122-344-5666'},
+            'pet': {'id': 400000},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        self.assertEqual(expected_404_builder('Can not check in, pet does not exist'), json.loads(res.data))
+        with self.app.app_context():
+            self.assertEqual(Owner.query.count(), 0)
+
+    def test_post_checkin__owner_name_null__returns_422_and_creates_nothing(self):
+        checkin = {
+            'owner': {'name': None, 'phone': '1'},
+            'pet': {'name': 'Fifi', 'species': 'dog'},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        self.assertEqual(expected_422_builder('Owner name must be text'), json.loads(res.data))
+        with self.app.app_context():
+            self.assertEqual(Owner.query.count(), 0)
+
+    def test_post_checkin__appointment_missing_time__returns_422_error(self):
+        checkin = {
+            'owner': {'id': 1},
+            'pet': {'id': 1},
+            'appointment': {'date': '2021-12-12'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=vet_tech_header)
+
+        self.assertEqual(expected_422_builder('Appointment must have a time'), json.loads(res.data))
+
+    def test_post_checkin__new_owner_without_post_owners_permission__returns_403_error(self):
+        checkin = {
+            'owner': {'name': 'Bob Ross', 'phone': '122-344-5666'},
+            'pet': {'id': 1},
+            'appointment': {'date': '2021-12-12', 'time': '10:00'}
+        }
+
+        res = self.client().post('/checkins', json=checkin, headers=auth_header(['post-appointments']))
+
+        self.assertEqual(res.status_code, 403)
+
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,273 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+from urllib.request import urlopen
+
+from auth import (AuthError, JwksCache, LocalKeys, TokenCache, check_permissions, compile_permissions,
+                  get_token_permissions)
+
+
+def jwk_builder(kid):
+    return {
+        'kty': 'RSA',
+        'kid': kid,
+        'use': 'sig',
+        'n': 'n-for-' + kid,
+        'e': 'AQAB',
+        'alg': 'RS256'
+    }
+
+
+class JwksCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.jwks_path = Path(self.directory.name) / 'jwks.json'
+        self.jwks_url = self.jwks_path.as_uri()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_jwks(self, *kids):
+        self.jwks_path.write_text(json.dumps({'keys': [jwk_builder(kid) for kid in kids]}))
+
+    def test_get_key__returns_matching_key_without_extra_fields(self):
+        self.write_jwks('first', 'second')
+        cache = JwksCache(self.jwks_url)
+
+        key = cache.get_key('second')
+
+        self.assertEqual(key, {'kty': 'RSA', 'kid': 'second', 'use': 'sig', 'n': 'n-for-second', 'e': 'AQAB'})
+
+    def test_get_key__keys_still_fresh__does_not_fetch_again(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=600)
+        cache.get_key('first')
+
+        os.remove(self.jwks_path)
+
+        self.assertEqual(cache.get_key('first')['kid'], 'first')
+
+    def test_get_key__ttl_passed__fetches_new_keys(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=0, refresh_interval=0)
+        cache.get_key('first')
+
+        self.write_jwks('second')
+
+        self.assertIsNone(cache.get_key('first'))
+        self.assertEqual(cache.get_key('second')['kid'], 'second')
+
+    def test_get_key__unknown_kid__forces_refresh(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=600, refresh_interval=0)
+        cache.get_key('first')
+
+        self.write_jwks('first', 'rotated')
+
+        self.assertEqual(cache.get_key('rotated')['kid'], 'rotated')
+
+    def test_get_key__unknown_kid_right_after_refresh__is_rate_limited(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=600, refresh_interval=600)
+        cache.get_key('first')
+
+        self.write_jwks('first', 'rotated')
+
+        self.assertIsNone(cache.get_key('rotated'))
+
+    def test_get_key__refresh_fails__serves_stale_keys(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=0, refresh_interval=0, stale_ttl=600)
+        cache.get_key('first')
+
+        os.remove(self.jwks_path)
+
+        self.assertEqual(cache.get_key('first')['kid'], 'first')
+
+    def test_get_key__refresh_fails_past_stale_ttl__raises_503(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=0, refresh_interval=0, stale_ttl=0)
+        cache.get_key('first')
+
+        os.remove(self.jwks_path)
+
+        with self.assertRaises(AuthError) as context:
+            cache.get_key('first')
+        self.assertEqual(context.exception.status_code, 503)
+
+    def test_get_key__refresh_already_running__serves_current_keys_without_waiting(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=0, refresh_interval=0)
+        cache.get_key('first')
+
+        # another thread stuck fetching from a provider that hangs
+        cache.lock.acquire()
+        self.addCleanup(cache.lock.release)
+
+        self.assertEqual(cache.get_key('first')['kid'], 'first')
+
+    def test_fetch__passes_timeout_to_urlopen(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, timeout=2.5)
+
+        with mock.patch('auth.urlopen', wraps=urlopen) as patched:
+            cache.get_key('first')
+
+        self.assertEqual(patched.call_args[1]['timeout'], 2.5)
+
+    def test_start_background_refresh__picks_up_new_keys_without_a_request(self):
+        self.write_jwks('first')
+        cache = JwksCache(self.jwks_url, ttl=600, refresh_interval=0)
+        stop = cache.start_background_refresh(interval=0.01)
+        self.addCleanup(stop.set)
+
+        self.write_jwks('second')
+        deadline = time.monotonic() + 2
+        while 'second' not in cache.keys and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertIn('second', cache.keys)
+
+
+class LocalKeysTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.keys_path = Path(self.directory.name) / 'keys.json'
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_keys(self, text, mtime):
+        self.keys_path.write_text(text)
+        os.utime(self.keys_path, (mtime, mtime))
+
+    def test_get_key__jwks_text__returns_matching_key(self):
+        keys = LocalKeys(text=json.dumps({'keys': [jwk_builder('first'), jwk_builder('second')]}))
+
+        self.assertEqual(keys.get_key('second')['n'], 'n-for-second')
+        self.assertIsNone(keys.get_key('unknown'))
+
+    def test_get_key__pem_key__used_for_any_kid(self):
+        pem = '-----BEGIN PUBLIC KEY-----\nabc\n-----END PUBLIC KEY-----\n'
+        keys = LocalKeys(text=pem)
+
+        self.assertEqual(keys.get_key('anything'), pem.strip())
+
+    def test_get_key__file_changed__reloads_keys(self):
+        self.write_keys(json.dumps({'keys': [jwk_builder('first')]}), 1000)
+        keys = LocalKeys(path=str(self.keys_path), check_interval=0)
+
+        self.write_keys(json.dumps({'keys': [jwk_builder('rotated')]}), 2000)
+
+        self.assertIsNone(keys.get_key('first'))
+        self.assertEqual(keys.get_key('rotated')['kid'], 'rotated')
+
+    def test_reload__file_invalid__keeps_current_keys(self):
+        self.write_keys(json.dumps({'keys': [jwk_builder('first')]}), 1000)
+        keys = LocalKeys(path=str(self.keys_path), check_interval=0)
+
+        self.write_keys('{"keys": [', 2000)
+
+        self.assertFalse(keys.reload())
+        self.assertEqual(keys.get_key('first')['kid'], 'first')
+
+    def test_import__keys_file_configured__verifies_with_local_keys(self):
+        self.write_keys(json.dumps({'keys': [jwk_builder('first')]}), 1000)
+        environment = dict(os.environ, JWT_PUBLIC_KEYS_FILE=str(self.keys_path))
+
+        result = subprocess.run(
+            [sys.executable, '-c', 'import auth; print(type(auth.signing_keys).__name__, *auth.signing_keys.keys)'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=environment, capture_output=True, text=True)
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split(), ['LocalKeys', 'first'])
+
+    def test_get_key__file_missing__raises_503(self):
+        keys = LocalKeys(path=str(self.keys_path))
+
+        with self.assertRaises(AuthError) as context:
+            keys.get_key('first')
+        self.assertEqual(context.exception.status_code, 503)
+
+
+class TokenCacheTests(unittest.TestCase):
+
+    def test_get__token_not_cached__counts_a_miss(self):
+        cache = TokenCache(max_size=10)
+
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_get__token_cached__returns_payload_and_counts_a_hit(self):
+        cache = TokenCache(max_size=10)
+        payload = {'sub': 'vet', 'exp': time.time() + 60}
+        cache.put('token', payload)
+
+        self.assertEqual(cache.get('token'), payload)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_get__token_expired__drops_entry(self):
+        cache = TokenCache(max_size=10)
+        cache.put('token', {'sub': 'vet', 'exp': time.time() - 1})
+
+        self.assertIsNone(cache.get('token'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_put__payload_without_exp__is_not_cached(self):
+        cache = TokenCache(max_size=10)
+        cache.put('token', {'sub': 'vet'})
+
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_put__cache_full__evicts_least_recently_used(self):
+        cache = TokenCache(max_size=2)
+        cache.put('first', {'exp': time.time() + 60})
+        cache.put('second', {'exp': time.time() + 60})
+        cache.get('first')
+
+        cache.put('third', {'exp': time.time() + 60})
+
+        self.assertIsNotNone(cache.get('first'))
+        self.assertIsNone(cache.get('second'))
+        self.assertIsNotNone(cache.get('third'))
+
+
+class PermissionTests(unittest.TestCase):
+
+    def test_compile_permissions__splits_permissions_by_method(self):
+        required = compile_permissions(['get-pets', 'post-pets', 'delete-pets'])
+
+        self.assertEqual(required['GET'], frozenset(['get-pets']))
+        self.assertEqual(required['POST'], frozenset(['post-pets']))
+        self.assertEqual(required['DELETE'], frozenset(['delete-pets']))
+        self.assertEqual(required['PUT'], frozenset())
+
+    def test_check_permissions__token_has_method_permission__passes(self):
+        granted = get_token_permissions({'permissions': ['get-pets', 'delete-pets']})
+
+        self.assertTrue(check_permissions(compile_permissions(['get-pets', 'delete-pets'])['DELETE'], granted))
+
+    def test_check_permissions__token_only_has_other_delete_permission__raises_403(self):
+        granted = get_token_permissions({'permissions': ['get-pets', 'delete-owners']})
+
+        with self.assertRaises(AuthError) as context:
+            check_permissions(compile_permissions(['get-pets', 'delete-pets'])['DELETE'], granted)
+        self.assertEqual(context.exception.status_code, 403)
+
+    def test_get_token_permissions__no_permissions_claim__raises_403(self):
+        with self.assertRaises(AuthError) as context:
+            get_token_permissions({'sub': 'vet'})
+        self.assertEqual(context.exception.status_code, 403)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
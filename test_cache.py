@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify
+
+from cache import CachedResponse, MemoryBackend, ResponseCache
+from models import Owner
+
+
+def entry(body):
+    return CachedResponse(body, 200, 'application/json', None)
+
+
+class MemoryBackendTests(unittest.TestCase):
+
+    def test_get__after_set__returns_entry(self):
+        backend = MemoryBackend(max_entries=10, max_bytes=1000, ttl=30)
+        backend.set('a', entry(b'{}'))
+
+        self.assertEqual(backend.get('a').body, b'{}')
+
+    def test_set__over_max_entries__evicts_least_recently_used(self):
+        backend = MemoryBackend(max_entries=2, max_bytes=1000, ttl=30)
+        backend.set('a', entry(b'a'))
+        backend.set('b', entry(b'b'))
+        backend.get('a')
+        backend.set('c', entry(b'c'))
+
+        self.assertIsNotNone(backend.get('a'))
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.stats(), {'entries': 2, 'bytes': 2})
+
+    def test_set__over_max_bytes__evicts_until_it_fits(self):
+        backend = MemoryBackend(max_entries=10, max_bytes=10, ttl=30)
+        backend.set('a', entry(b'123456'))
+        backend.set('b', entry(b'123456'))
+
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.stats(), {'entries': 1, 'bytes': 6})
+
+    def test_get__entry_past_ttl__returns_none(self):
+        backend = MemoryBackend(max_entries=10, max_bytes=1000, ttl=30)
+        with mock.patch('cache.time.monotonic', return_value=100):
+            backend.set('a', entry(b'{}'))
+        with mock.patch('cache.time.monotonic', return_value=131):
+            self.assertIsNone(backend.get('a'))
+
+    def test_bump__increments_table_generation(self):
+        backend = MemoryBackend(max_entries=10, max_bytes=1000, ttl=30)
+        backend.bump('owners')
+        backend.bump('owners')
+
+        self.assertEqual(backend.generation('owners'), 2)
+        self.assertEqual(backend.generation('pets'), 0)
+
+
+class CachedResponseTests(unittest.TestCase):
+
+    def test_loads__reads_back_dumps(self):
+        original = CachedResponse(b'{"a":1}\n', 200, 'application/json', 'abc')
+
+        loaded = CachedResponse.loads(original.dumps())
+
+        self.assertEqual((loaded.body, loaded.status, loaded.mimetype, loaded.etag),
+                         (b'{"a":1}\n', 200, 'application/json', 'abc'))
+
+
+class ResponseCacheTests(unittest.TestCase):
+
+    def test_from_config__none__returns_no_cache(self):
+        self.assertIsNone(ResponseCache.from_config({'RESPONSE_CACHE': 'none'}))
+
+    def test_stats__no_lookups__hit_ratio_is_none(self):
+        cache = ResponseCache(MemoryBackend(max_entries=10, max_bytes=1000, ttl=30))
+
+        self.assertIsNone(cache.stats()['hit_ratio'])
+
+    def test_key__value_containing_encoded_separators__differs_from_separate_args(self):
+        cache = ResponseCache(MemoryBackend(max_entries=10, max_bytes=1000, ttl=30))
+        app = Flask(__name__)
+        token = {'permissions': ['get-owners']}
+
+        with app.test_request_context('/owners?name=B&phone=5'):
+            separate = cache.key(Owner, token)
+        with app.test_request_context('/owners?name=B%26phone%3D5'):
+            combined = cache.key(Owner, token)
+
+        self.assertNotEqual(separate, combined)
+
+    def test_cached__replica_read_right_after_a_write__is_not_stored(self):
+        cache = ResponseCache(MemoryBackend(max_entries=10, max_bytes=1000, ttl=30), replica_lag=30)
+        app = Flask(__name__)
+        view = cache.cached(Owner)(lambda auth_token: jsonify({'owners': []}))
+        cache.invalidate('owners')
+
+        with mock.patch('cache.db') as db:
+            db.session.return_value.replica = object()
+            with app.test_request_context('/owners'):
+                view({})
+            self.assertEqual(cache.backend.stats()['entries'], 0)
+
+            db.session.return_value.replica = None
+            with app.test_request_context('/owners'):
+                view({})
+            self.assertEqual(cache.backend.stats()['entries'], 1)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from app import create_app
+from database import CHECKOUT_SECONDS, ReplicaSet, TimedQueuePool, engine_options
+from models import db, Owner
+
+config = {
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_STATEMENT_TIMEOUT': 0,
+    'DB_PGBOUNCER': False,
+}
+
+
+def checkout_count():
+    _, _, _, samples = next(CHECKOUT_SECONDS.collect())
+    return sum(value for name, labels, value in samples if name == 'db_pool_checkout_seconds_count')
+
+
+class EngineOptionsTests(unittest.TestCase):
+
+    def test_engine_options__defaults__uses_timed_queue_pool(self):
+        options = engine_options(config, 'postgresql://localhost/pet_checkin')
+
+        self.assertIs(options['poolclass'], TimedQueuePool)
+        self.assertEqual((options['pool_size'], options['max_overflow'], options['pool_recycle']), (5, 10, 1800))
+        self.assertNotIn('connect_args', options)
+
+    def test_engine_options__statement_timeout__passed_as_startup_option(self):
+        options = engine_options({**config, 'DB_STATEMENT_TIMEOUT': 5000}, 'postgresql://localhost/pet_checkin')
+
+        self.assertEqual(options['connect_args'], {'options': '-c statement_timeout=5000'})
+
+    def test_engine_options__pgbouncer__uses_null_pool_without_startup_options(self):
+        options = engine_options({**config, 'DB_PGBOUNCER': True, 'DB_STATEMENT_TIMEOUT': 5000},
+                                 'postgresql://localhost/pet_checkin')
+
+        self.assertIs(options['poolclass'], NullPool)
+        self.assertNotIn('pool_size', options)
+        self.assertNotIn('connect_args', options)
+        self.assertEqual(options['local_statement_timeout'], 5000)
+
+    def test_timed_queue_pool__checkout__records_wait(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool)
+        before = checkout_count()
+
+        with engine.connect() as connection:
+            connection.execute('select 1')
+
+        self.assertEqual(checkout_count(), before + 1)
+
+    def test_timed_queue_pool__connection_from_another_process__is_replaced(self):
+        engine = create_engine('sqlite://', poolclass=TimedQueuePool)
+        with engine.connect() as connection:
+            first = connection.connection.connection
+        record = engine.pool._pool.queue[0]
+        record.info['pid'] = -1
+
+        with engine.connect() as connection:
+            self.assertIsNot(connection.connection.connection, first)
+
+
+class ReplicaSetTests(unittest.TestCase):
+
+    def test_choose__healthy_replicas__round_robin(self):
+        first, second = create_engine('sqlite://'), create_engine('sqlite://')
+        replicas = ReplicaSet([first, second])
+
+        self.assertEqual([replicas.choose() for _ in range(3)], [first, second, first])
+
+    def test_choose__replica_unreachable__skips_it(self):
+        broken = create_engine('sqlite:////nonexistent/directory/replica.db')
+        healthy = create_engine('sqlite://')
+        replicas = ReplicaSet([broken, healthy])
+
+        self.assertEqual([replicas.choose() for _ in range(2)], [healthy, healthy])
+        self.assertGreater(replicas.down_until[broken], 0)
+
+    def test_choose__every_replica_down__returns_none(self):
+        replicas = ReplicaSet([create_engine('sqlite:////nonexistent/directory/replica.db')])
+
+        self.assertIsNone(replicas.choose())
+
+
+class RoutingSessionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.database_path = os.environ['TEST_DATABASE_URL']
+        self.app = create_app({'DATABASE_REPLICA_URLS': [self.database_path]})
+        self.replica = self.app.extensions['replicas'].engines[0]
+        # the app doesn't create the schema itself
+        with self.app.app_context():
+            db.create_all()
+
+    def test_get_bind__get_request__uses_replica(self):
+        with self.app.test_request_context('/owners', method='GET'):
+            self.assertIs(db.session.get_bind(Owner.__mapper__), self.replica)
+            db.session.remove()
+
+    def test_get_bind__post_request__uses_primary(self):
+        with self.app.test_request_context('/owners', method='POST'):
+            self.assertIs(db.session.get_bind(Owner.__mapper__), db.engine)
+            db.session.remove()
+
+    def test_get_bind__after_a_write__stays_on_primary(self):
+        with self.app.test_request_context('/owners', method='GET'):
+            db.session.add(Owner('Bob', '321-456-0987'))
+            db.session.flush()
+
+            self.assertIs(db.session.get_bind(Owner.__mapper__), db.engine)
+            db.session.rollback()
+            db.session.remove()
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import unittest
+
+from app import create_app
+from local_auth import auth_header, VET_TECH_PERMISSIONS
+from metrics import Counter, Histogram, Registry
+from models import db, Owner
+
+vet_tech_header = auth_header(VET_TECH_PERMISSIONS)
+
+metrics_header = auth_header(['get-metrics'])
+
+
+class RegistryTests(unittest.TestCase):
+
+    def test_render__counter__writes_prometheus_text(self):
+        registry = Registry()
+        counter = Counter('requests_total', 'Requests')
+        registry.add_collector(counter.collect)
+        counter.inc(route='/owners', status=200)
+        counter.inc(route='/owners', status=200)
+
+        self.assertEqual(registry.render(), '# HELP requests_total Requests\n'
+                                            '# TYPE requests_total counter\n'
+                                            'requests_total{route="/owners",status="200"} 2\n')
+
+    def test_render__histogram__writes_cumulative_buckets_count_and_sum(self):
+        registry = Registry()
+        histogram = Histogram('latency_seconds', 'Latency', buckets=(0.1, 1))
+        registry.add_collector(histogram.collect)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+
+        lines = registry.render().splitlines()
+
+        self.assertEqual(lines[2:], [
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 2',
+            'latency_seconds_count 2',
+            'latency_seconds_sum 0.55',
+        ])
+
+    def test_render__extra_labels__added_to_every_sample(self):
+        registry = Registry()
+        counter = Counter('requests_total', 'Requests')
+        registry.add_collector(counter.collect)
+        counter.inc(route='/owners')
+
+        self.assertIn('requests_total{route="/owners",worker="7"} 1', registry.render(labels={'worker': 7}))
+
+
+class MetricsEndpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': os.environ['TEST_DATABASE_URL']})
+        self.client = self.app.test_client
+        with self.app.app_context():
+            db.create_all()
+            Owner('Bob', '321-456-0987').insert()
+
+    def tearDown(self):
+        with self.app.app_context():
+            Owner.query.delete()
+            db.session.commit()
+
+    def test_get_metrics__after_a_request__has_route_auth_and_db_series(self):
+        self.client().get('/owners', headers=vet_tech_header)
+
+        res = self.client().get('/metrics', headers=metrics_header)
+
+        body = res.data.decode()
+        worker = f'worker="{os.getpid()}"'
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(f'http_requests_total{{method="GET",route="/owners",status="200",{worker}}}', body)
+        self.assertIn(f'http_request_duration_seconds_count{{method="GET",route="/owners",{worker}}}', body)
+        self.assertIn(f'auth_duration_seconds_count{{step="header",{worker}}}', body)
+        self.assertIn(f'db_queries_per_request_count{{route="/owners",{worker}}}', body)
+
+    def test_get_metrics__without_metrics_permission__returns_403(self):
+        res = self.client().get('/metrics', headers=vet_tech_header)
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_request__same_statement_over_limit__logs_n_plus_one_warning(self):
+        self.app.config['DB_REPEATED_QUERY_LIMIT'] = 2
+
+        @self.app.route('/loop')
+        def loop():
+            for _ in range(3):
+                Owner.query.filter_by(id=1).first()
+            return 'done'
+
+        with self.assertLogs('instrumentation', 'WARNING') as logs:
+            self.client().get('/loop')
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Statement ran 3 times in GET /loop', logs.output[0])
+
+    def test_request__query_over_slow_threshold__logs_it_with_route(self):
+        self.app.config['DB_SLOW_QUERY_MS'] = 0.000001
+
+        with self.assertLogs('instrumentation', 'WARNING') as logs:
+            self.client().get('/owners/1', headers=vet_tech_header)
+
+        self.assertIn('in GET /owners/<owner_id>: SELECT', logs.output[0])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
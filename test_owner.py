@@ -6,15 +6,13 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import text as sa_text
 
 from app import create_app
-from models import setup_db, Owner
+from instrumentation import assert_max_queries
+from local_auth import auth_header, VET_ADMIN_PERMISSIONS, VET_TECH_PERMISSIONS
+from models import db, setup_db, Owner, Pet, Appointment
 
-vet_tech_header = {
-    'Authorization': os.environ['VET_TECH_HEADER']
-}
+vet_tech_header = auth_header(VET_TECH_PERMISSIONS)
 
-vet_admin_header = {
-    'Authorization': os.environ['VET_ADMIN_HEADER']
-}
+vet_admin_header = auth_header(VET_ADMIN_PERMISSIONS)
 
 
 def expected_404_builder(message):
@@ -47,6 +45,8 @@ class OwnerEndpoints(unittest.TestCase):
             self.db.init_app(self.app)
             self.db.drop_all()
             self.db.create_all()
+            # the app doesn't create the schema itself
+            db.create_all()
 
     def tearDown(self):
         # remove any data between tests
@@ -81,6 +81,18 @@ class OwnerEndpoints(unittest.TestCase):
         self.assertEqual(len(owners), 1)
         self.assertEqual(owners[0], {'id': 1, 'name': 'Bob', 'phone': '321-456-0987'})
 
+    def test_head_owners__answers_like_get_without_a_body(self):
+        with self.app.app_context():
+            Owner('Bob', "321-456-0987").insert()
+
+        res = self.client().head('/owners', headers=vet_tech_header)
+        owner = self.client().head('/owners/1', headers=vet_tech_header)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, b'')
+        self.assertIn('ETag', res.headers)
+        self.assertEqual(owner.status_code, 200)
+
     def test_get_owners__no_owners_in_database__returns_404_error(self):
         res = self.client().get('/owners', headers=vet_tech_header)
 
@@ -88,6 +100,61 @@ class OwnerEndpoints(unittest.TestCase):
 
         self.assertEqual(expected_404_builder('No owners found'), actual_response)
 
+    def test_get_owners__repeated_then_owner_added__served_from_cache_until_write(self):
+        with self.app.app_context():
+            Owner('Bob', "321-456-0987").insert()
+        response_cache = self.app.extensions['response_cache']
+
+        first = self.client().get('/owners', headers=vet_tech_header)
+        second = self.client().get('/owners', headers=vet_tech_header)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual((response_cache.hits, response_cache.misses), (1, 1))
+
+        self.client().post('/owners', json={'name': 'Jim', 'phone': '222-222-2222'}, headers=vet_tech_header)
+        res = self.client().get('/owners', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual([owner['name'] for owner in data['owners']], ['Bob', 'Jim'])
+        self.assertEqual(response_cache.misses, 2)
+
+    def test_get_owners__limit_passed_in__returns_page_and_next_cursor(self):
+        with self.app.app_context():
+            Owner('First', "111-111-1111").insert()
+            Owner('Second', "222-222-2222").insert()
+            Owner('Third', "333-333-3333").insert()
+
+        res = self.client().get('/owners?limit=2', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([owner['id'] for owner in data['owners']], [1, 2])
+        self.assertEqual(data['next_cursor'], 2)
+
+        res = self.client().get('/owners?limit=2&after=2', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(data['owners'], [{'id': 3, 'name': 'Third', 'phone': '333-333-3333'}])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_get_owners__fields_passed_in__returns_only_those_fields(self):
+        with self.app.app_context():
+            Owner('Bob', "321-456-0987").insert()
+
+        res = self.client().get('/owners?fields=name', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['owners'], [{'name': 'Bob'}])
+
+    def test_get_owners__unknown_field_passed_in__returns_422_error(self):
+        res = self.client().get('/owners?fields=name,address', headers=vet_tech_header)
+
+        actual_response = json.loads(res.data)
+
+        self.assertEqual(expected_422_builder('Unknown field: address'), actual_response)
+
     def test_get_owner__returns_owner_with_matching_id(self):
         with self.app.app_context():
             Owner('Who dat?', "111-222-0000").insert()
@@ -101,6 +168,34 @@ class OwnerEndpoints(unittest.TestCase):
         owner = data['owner']
         self.assertEqual(owner, {'name': 'Jim', 'phone': '222-222-2222', 'id': 2})
 
+    def test_get_owner__embed_appointments__returns_owner_with_appointments(self):
+        with self.app.app_context():
+            Owner('Bob Ross', '122-344-5666').insert()
+            Pet('Fifi', "dog", 'pug').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '11:00', 1, 1).insert()
+
+        res = self.client().get('/owners/1?embed=appointments', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['owner']['name'], 'Bob Ross')
+        self.assertEqual([appointment['date'] for appointment in data['owner']['appointments']],
+                         ['2021-12-12', '2022-01-10'])
+
+    def test_get_owners__embed_appointments__runs_the_same_queries_for_any_number_of_owners(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", 'pug').insert()
+            for number in range(5):
+                Owner(f'Owner {number}', "111-111-1111").insert()
+                Appointment('2021-12-12', '10:00', 1, number + 1).insert()
+
+        with assert_max_queries(2):
+            res = self.client().get('/owners?embed=appointments', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual([len(owner['appointments']) for owner in data['owners']], [1, 1, 1, 1, 1])
+
     def test_get_owners__owner_not_in_database__returns_404_error(self):
         res = self.client().get('/owners/100', headers=vet_tech_header)
 
@@ -115,9 +210,12 @@ class OwnerEndpoints(unittest.TestCase):
             'phone': '111-222-3333'
         }
 
-        post_res = self.client().post('/owners', json=request_body,  headers=vet_tech_header)
+        with assert_max_queries(1):
+            post_res = self.client().post('/owners', json=request_body,  headers=vet_tech_header)
 
-        self.assertEqual(post_res.status_code, 204)
+        self.assertEqual(post_res.status_code, 201)
+        self.assertEqual(json.loads(post_res.data)['owner'], {'id': 1, 'name': 'Dude', 'phone': '111-222-3333'})
+        self.assertTrue(post_res.headers['Location'].endswith('/owners/1'))
 
         res = self.client().get('/owners', headers=vet_tech_header)
         data = json.loads(res.data)
@@ -194,6 +292,19 @@ class OwnerEndpoints(unittest.TestCase):
         actual_response = json.loads(res.data)
         self.assertEqual(expected_422_builder('Request missing body'), actual_response)
 
+    def test_patch_owner__null_name__returns_422_error(self):
+        with self.app.app_context():
+            Owner('Bob', '321-456-0987').insert()
+
+        res = self.client().patch('/owners/1', json={'name': None}, headers=vet_tech_header)
+        actual_response = json.loads(res.data)
+        self.assertEqual(expected_422_builder('Name must be text'), actual_response)
+
+    def test_bulk_patch_owners__null_phone__returns_422_error(self):
+        res = self.client().patch('/owners', json={'ids': [1], 'values': {'phone': None}}, headers=vet_tech_header)
+        actual_response = json.loads(res.data)
+        self.assertEqual(expected_422_builder('Phone must be text'), actual_response)
+
     def test_update_owner__no_update_data_passed_in__returns_422_error(self):
         res = self.client().put('/owners/1', json={}, headers=vet_tech_header)
         actual_response = json.loads(res.data)
@@ -221,6 +332,27 @@ class OwnerEndpoints(unittest.TestCase):
         actual_response = json.loads(res.data)
         self.assertEqual(expected_404_builder('Owner not found'), actual_response)
 
+    def test_delete_owner__owner_has_appointments__deletes_them_and_returns_counts(self):
+        with self.app.app_context():
+            Owner('Bob Ross', '122-344-5666').insert()
+            Owner('Jim', '222-222-2222').insert()
+            Pet('Fifi', "dog", 'pug').insert()
+            Appointment('2021-12-12', '10:00', 1, 1).insert()
+            Appointment('2022-01-10', '10:00', 1, 1).insert()
+            Appointment('2022-01-11', '10:00', 1, 2).insert()
+
+        # the owner, its appointments in one statement, then the owner itself
+        with assert_max_queries(3):
+            res = self.client().delete('/owners/1', headers=vet_admin_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['deleted'], {'owners': 1, 'appointments': 2})
+
+        res = self.client().get('/appointments', headers=vet_admin_header)
+        data = json.loads(res.data)
+        self.assertEqual([appointment['owner_id'] for appointment in data['appointments']], [2])
+
     def test_delete_owner__owner_not_in_database__returns_404_error(self):
         res = self.client().delete('/owners/400000', headers=vet_admin_header)
         actual_response = json.loads(res.data)
@@ -6,15 +6,13 @@ from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.sql import text as sa_text
 
 from app import create_app
-from models import Pet, setup_db
+from instrumentation import assert_max_queries
+from local_auth import auth_header, VET_ADMIN_PERMISSIONS, VET_TECH_PERMISSIONS
+from models import db, Appointment, Owner, Pet, setup_db
 
-vet_tech_header = {
-    'Authorization': os.environ['VET_TECH_HEADER']
-}
+vet_tech_header = auth_header(VET_TECH_PERMISSIONS)
 
-vet_admin_header = {
-    'Authorization': os.environ['VET_ADMIN_HEADER']
-}
+vet_admin_header = auth_header(VET_ADMIN_PERMISSIONS)
 
 
 def expected_404_builder(message):
@@ -47,6 +45,8 @@ class PetEndpoints(unittest.TestCase):
             self.db.init_app(self.app)
             self.db.drop_all()
             self.db.create_all()
+            # the app doesn't create the schema itself
+            db.create_all()
 
     def tearDown(self):
         # remove any data between tests
@@ -81,6 +81,35 @@ class PetEndpoints(unittest.TestCase):
         self.assertEqual(len(pets), 1)
         self.assertEqual(pets[0], {'id': 1, 'name': 'Fifi', 'species': 'dog', 'breed': 'pug'})
 
+    def test_get_pets__species_passed_in__returns_only_that_species(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", "pug").insert()
+            Pet('Tom', "cat", "tabby").insert()
+            Pet('Rex', "dog", "boxer").insert()
+
+        res = self.client().get('/pets?species=dog', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([pet['name'] for pet in data['pets']], ['Fifi', 'Rex'])
+
+    def test_get_pets__name_prefix_passed_in__returns_pets_starting_with_it(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", "pug").insert()
+            Pet('Fido', "dog", "boxer").insert()
+            Pet('Tom', "cat", "tabby").insert()
+            Pet('F%', "cat", "tabby").insert()
+
+        res = self.client().get('/pets?name=Fi', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual([pet['name'] for pet in data['pets']], ['Fifi', 'Fido'])
+
+        res = self.client().get('/pets?name=F%25', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual([pet['name'] for pet in data['pets']], ['F%'])
+
     def test_get_pets__no_pets_in_database__returns_404_error(self):
         res = self.client().get('/pets', headers=vet_tech_header)
 
@@ -101,6 +130,53 @@ class PetEndpoints(unittest.TestCase):
         pet = data['pet']
         self.assertEqual(pet, {'id': 2, 'name': 'Libby', 'species': 'dog', 'breed': 'black lab'})
 
+    def test_get_pet__client_has_current_etag__returns_304_until_pet_changes(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", "pug").insert()
+
+        res = self.client().get('/pets/1', headers=vet_tech_header)
+        etag = res.headers['ETag']
+
+        res = self.client().get('/pets/1', headers={**vet_tech_header, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.data, b'')
+
+        self.client().put('/pets/1', json={'name': 'Fluffy'}, headers=vet_tech_header)
+
+        res = self.client().get('/pets/1', headers={**vet_tech_header, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(json.loads(res.data)['pet']['name'], 'Fluffy')
+
+    def test_get_pets__client_has_current_etag__returns_304_until_pets_change(self):
+        with self.app.app_context():
+            Pet('Fifi', "dog", "pug").insert()
+
+        res = self.client().get('/pets', headers=vet_tech_header)
+        etag = res.headers['ETag']
+
+        res = self.client().get('/pets', headers={**vet_tech_header, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 304)
+
+        self.client().post('/pets', json={'name': 'Tom', 'species': 'cat'}, headers=vet_tech_header)
+
+        res = self.client().get('/pets', headers={**vet_tech_header, 'If-None-Match': etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data)['pets']), 2)
+
+    def test_get_pets__embed_appointments__runs_the_same_queries_for_any_number_of_pets(self):
+        with self.app.app_context():
+            Owner('Bob Ross', '122-344-5666').insert()
+            for number in range(5):
+                Pet(f'Pet {number}', "dog").insert()
+                Appointment('2021-12-12', '10:00', number + 1, 1).insert()
+
+        with assert_max_queries(2):
+            res = self.client().get('/pets?embed=appointments', headers=vet_tech_header)
+
+        data = json.loads(res.data)
+        self.assertEqual([len(pet['appointments']) for pet in data['pets']], [1, 1, 1, 1, 1])
+
     def test_get_pets__pet_not_in_database__returns_404_error(self):
         res = self.client().get('/pets/100', headers=vet_tech_header)
 
@@ -118,7 +194,9 @@ class PetEndpoints(unittest.TestCase):
 
         post_res = self.client().post('/pets', json=request_body, headers=vet_tech_header)
 
-        self.assertEqual(post_res.status_code, 204)
+        self.assertEqual(post_res.status_code, 201)
+        self.assertEqual(json.loads(post_res.data)['pet'], dict(request_body, id=1))
+        self.assertTrue(post_res.headers['Location'].endswith('/pets/1'))
 
         res = self.client().get('/pets', headers=vet_tech_header)
         data = json.loads(res.data)
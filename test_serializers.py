@@ -0,0 +1,39 @@
+import unittest
+
+from flask import Flask, jsonify
+
+from serializers import dumps, json_response
+
+
+class SerializerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+
+    def assert_same_as_jsonify(self, data):
+        with self.app.app_context():
+            self.assertEqual(dumps(data), jsonify(data).get_data())
+
+    def test_dumps__matches_jsonify_bytes(self):
+        self.assert_same_as_jsonify({
+            'success': True,
+            'next_cursor': None,
+            'appointments': [{'id': 1, 'time': '10:00', 'date': '2021-12-12', 'pet_id': 1, 'owner_id': 1}]
+        })
+
+    def test_dumps__non_ascii_text__matches_jsonify_bytes(self):
+        self.assert_same_as_jsonify({'owners': [{'id': 1, 'name': 'Zoë Müller 🐶', 'phone': '555'}]})
+
+    def test_dumps__no_newline__leaves_off_trailing_newline(self):
+        self.assertEqual(dumps({'b': 1, 'a': 'x'}, newline=False), b'{"a":"x","b":1}')
+
+    def test_json_response__sets_json_mimetype_and_status(self):
+        response = json_response({'success': True}, 201)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.mimetype, 'application/json')
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
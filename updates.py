@@ -0,0 +1,86 @@
+'''
+PATCH updates as a single UPDATE statement, without loading the rows
+into the session first. The rows that matched come back with RETURNING,
+so a missing id is a 404 without a separate lookup
+'''
+from flask import abort, jsonify, request
+from sqlalchemy import exc
+
+from queries import public_fields, row_formatter
+from shared_db import db
+
+
+def update_rows(model, ids, values):
+    '''
+    Updates every row in ids to values and returns the changed rows,
+    formatted and in id order. On databases without RETURNING (sqlite)
+    the rows are read back in the same transaction instead
+    '''
+    table = model.__table__
+    fields = public_fields(model)
+    columns = [table.c[field] for field in fields]
+    format_row = row_formatter(model, fields)
+
+    statement = table.update().where(table.c.id.in_(ids)).values(values)
+    try:
+        # the dialect only knows whether the server supports RETURNING once it has connected
+        if db.session.connection(clause=statement).dialect.implicit_returning:
+            rows = db.session.execute(statement.returning(*columns)).fetchall()
+        else:
+            result = db.session.execute(statement)
+            rows = db.session.query(*columns).filter(table.c.id.in_(ids)).all() if result.rowcount else []
+        db.session.commit()
+    except exc.IntegrityError:
+        db.session.rollback()
+        abort(422, {'message': 'Can not update, a value breaks a database constraint'})
+
+    return [format_row(row) for row in sorted(rows, key=lambda row: row[0])]
+
+
+def update_one(model, row_id, validate, values, name):
+    update_data = request.json
+
+    message = validate(update_data)
+    if message is not None:
+        abort(422, {'message': message})
+
+    rows = update_rows(model, [row_id], values(update_data))
+    if len(rows) == 0:
+        abort(404, {'message': f'Can not update, {name} does not exist'})
+
+    return jsonify({
+        'success': True,
+        name: rows[0]
+    }), 200
+
+
+def bulk_update(model, validate, values, plural):
+    '''
+    Sets the same values on many rows at once from
+    {"ids": [...], "values": {...}}, e.g. moving a day's appointments
+    '''
+    update_data = request.get_json(silent=True)
+    if not isinstance(update_data, dict):
+        abort(422, {'message': 'Request missing body'})
+
+    ids = update_data.get('ids')
+    if not isinstance(ids, list) or len(ids) == 0:
+        abort(422, {'message': 'Request must have a list of ids'})
+    if not all(isinstance(row_id, int) and not isinstance(row_id, bool) for row_id in ids):
+        abort(422, {'message': 'ids must be numbers'})
+
+    message = validate(update_data.get('values'))
+    if message is not None:
+        abort(422, {'message': message})
+
+    rows = update_rows(model, ids, values(update_data['values']))
+    if len(rows) == 0:
+        abort(404, {'message': f'Can not update, no {plural} found'})
+
+    updated = {row['id'] for row in rows}
+    return jsonify({
+        'success': True,
+        'updated': len(rows),
+        'not_found': sorted(set(ids) - updated),
+        plural: rows
+    }), 200
@@ -0,0 +1,170 @@
+'''
+Checks shared by the single and bulk endpoints, each returns the
+message for the first problem found or None when the data is valid
+'''
+from models import parse_date, parse_time
+
+
+def validate_owner(owner_data):
+    if not isinstance(owner_data, dict):
+        return 'Request missing body'
+    if 'name' not in owner_data:
+        return 'Owner must have a name'
+    if 'phone' not in owner_data:
+        return 'Owner must have a phone number'
+    return None
+
+
+def validate_pet(pet_data):
+    if not isinstance(pet_data, dict):
+        return 'Request missing body'
+    if 'name' not in pet_data:
+        return 'Pet must have a name'
+    if 'species' not in pet_data:
+        return 'Pet must have a species'
+    return None
+
+
+def validate_appointment(appointment_data):
+    if not isinstance(appointment_data, dict):
+        return 'Request missing body'
+    if 'date' not in appointment_data:
+        return 'Appointment must have a date'
+    if 'time' not in appointment_data:
+        return 'Appointment must have a time'
+    if 'pet_id' not in appointment_data:
+        return 'Appointment must have a pet'
+    if 'owner_id' not in appointment_data:
+        return 'Appointment must have an owner'
+    for field in ('pet_id', 'owner_id'):
+        try:
+            parse_id(appointment_data[field])
+        except ValueError:
+            return f'Appointment {field} must be a number'
+    return validate_date_time(appointment_data)
+
+
+def parse_id(value):
+    # numeric strings like "1" are accepted the same way by the single and bulk endpoints
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise ValueError(f'Invalid id: {value}')
+
+
+def validate_date_time(appointment_data):
+    if 'date' in appointment_data:
+        try:
+            parse_date(appointment_data['date'])
+        except ValueError:
+            return 'Appointment date must be a date like 2021-12-31'
+    if 'time' in appointment_data:
+        try:
+            parse_time(appointment_data['time'])
+        except ValueError:
+            return 'Appointment time must be a time like 14:30'
+    return None
+
+
+def validate_update(update_data, fields, required=()):
+    if not isinstance(update_data, dict):
+        return 'Request missing body'
+    if not any(field in update_data for field in fields):
+        return 'Must include a value to update'
+    # columns that can't be null in the database
+    for field in required:
+        if field in update_data and not isinstance(update_data[field], str):
+            return f'{field.capitalize()} must be text'
+    return None
+
+
+def validate_owner_update(update_data):
+    return validate_update(update_data, ('name', 'phone'), required=('name', 'phone'))
+
+
+def validate_pet_update(update_data):
+    return validate_update(update_data, ('name', 'species', 'breed'), required=('name', 'species'))
+
+
+def validate_appointment_update(update_data):
+    return validate_update(update_data, ('date', 'time')) or validate_date_time(update_data)
+
+
+def validate_checkin(checkin_data):
+    '''
+    The owner and pet are either {"id": ...} for existing ones or the fields
+    for new ones, the appointment has just the date and time
+    '''
+    if not isinstance(checkin_data, dict):
+        return 'Request missing body'
+    for name, article, validate, required in (('owner', 'an', validate_owner, ('name', 'phone')),
+                                              ('pet', 'a', validate_pet, ('name', 'species'))):
+        data = checkin_data.get(name)
+        if not isinstance(data, dict):
+            return f'Check-in must have {article} {name}'
+        if 'id' in data:
+            try:
+                parse_id(data['id'])
+            except ValueError:
+                return f'{name.capitalize()} id must be a number'
+        else:
+            message = validate(data)
+            if message is not None:
+                return message
+            for field in required:
+                if not isinstance(data[field], str):
+                    return f'{name.capitalize()} {field} must be text'
+
+    appointment_data = checkin_data.get('appointment')
+    if not isinstance(appointment_data, dict):
+        return 'Check-in must have an appointment'
+    if 'date' not in appointment_data:
+        return 'Appointment must have a date'
+    if 'time' not in appointment_data:
+        return 'Appointment must have a time'
+    return validate_date_time(appointment_data)
+
+
+def owner_values(owner_data):
+    return {
+        'name': owner_data['name'],
+        'phone': owner_data['phone']}
+
+
+def pet_values(pet_data):
+    # breed is optional
+    return {
+        'name': pet_data['name'],
+        'species': pet_data['species'],
+        'breed': pet_data.get('breed', '')}
+
+
+def appointment_values(appointment_data):
+    return {
+        'date': parse_date(appointment_data['date']),
+        'time': parse_time(appointment_data['time']),
+        'pet_id': parse_id(appointment_data['pet_id']),
+        'owner_id': parse_id(appointment_data['owner_id'])}
+
+
+def update_values(update_data, fields):
+    # only the fields that were sent, so an update can change a single column
+    return {field: update_data[field] for field in fields if field in update_data}
+
+
+def owner_update_values(update_data):
+    return update_values(update_data, ('name', 'phone'))
+
+
+def pet_update_values(update_data):
+    return update_values(update_data, ('name', 'species', 'breed'))
+
+
+def appointment_update_values(update_data):
+    values = update_values(update_data, ('date', 'time'))
+    if 'date' in values:
+        values['date'] = parse_date(values['date'])
+    if 'time' in values:
+        values['time'] = parse_time(values['time'])
+    return values